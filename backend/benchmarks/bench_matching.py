@@ -0,0 +1,172 @@
+# bench_matching.py
+#
+# Benchmark for the loan matching engine: fills an OrderBook with 100k+
+# synthetic open orders, then times a stream of arriving requests, offers
+# and cancels, and checks a sample of lookups against a brute-force scan.
+#
+#   python backend/benchmarks/bench_matching.py --orders 200000 --events 20000
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from loan_matching import OrderBook, LoanRequest, LoanOffer, duration_bucket, score_level
+from bench_scoring import percentile
+
+DURATIONS_DAYS = (7, 10, 14, 30, 45, 60, 90, 180, 365)
+INTEREST_RATES = tuple(x / 4 for x in range(12, 61))  # 3% - 15% in 0.25% steps
+
+
+class OrderGenerator:
+    """Seeded stream of random requests and offers with realistic-ish fields."""
+    def __init__(self, seed: int, users: int = 50000):
+        self.rng = random.Random(seed)
+        self.users = users
+        self.count = 0
+
+    def _user(self):
+        return "0x%040x" % self.rng.randrange(self.users)
+
+    def request(self):
+        self.count += 1
+        return LoanRequest(
+            f"r{self.count}", self._user(), self.rng.choice((100, 250, 500, 800, 1000, 1500, 2500, 5000)),
+            self.rng.choice(DURATIONS_DAYS), self.rng.randint(300, 850),
+        )
+
+    def offer(self):
+        self.count += 1
+        return LoanOffer(
+            f"o{self.count}", self._user(), self.rng.choice((200, 500, 1000, 2000, 5000, 10000)),
+            self.rng.choice(INTEREST_RATES), self.rng.choice(DURATIONS_DAYS), self.rng.choice((0, 300, 450, 550, 600, 650, 700, 750)),
+        )
+
+
+def brute_force_best_offer(book: OrderBook, request: LoanRequest):
+    """Reference answer for OrderBook.best_offer(): a scan over every open offer."""
+    candidates = [
+        offer for offer in book.offers.values()
+        if duration_bucket(offer.duration_days) == duration_bucket(request.duration_days)
+        and offer.min_risk_score <= request.risk_score
+        and offer.amount >= request.amount
+        and offer.lender_id != request.borrower_id
+    ]
+    return min(candidates, key=lambda offer: (offer.interest_rate, offer.amount, offer.seq), default=None)
+
+
+def brute_force_best_request(book: OrderBook, offer: LoanOffer):
+    """Reference answer for OrderBook.best_request()."""
+    candidates = [
+        request for request in book.requests.values()
+        if duration_bucket(request.duration_days) == duration_bucket(offer.duration_days)
+        and request.risk_score >= offer.min_risk_score
+        and request.amount <= offer.amount
+        and request.borrower_id != offer.lender_id
+    ]
+    return max(candidates, key=lambda request: (score_level(request.risk_score), request.amount, -request.seq), default=None)
+
+
+def summarize(name: str, latencies: list):
+    latencies = sorted(latencies)
+    total = sum(latencies)
+    return {
+        "operation": name,
+        "count": len(latencies),
+        "ops_per_s": round(len(latencies) / total, 1) if total else 0.0,
+        "p50_us": round(percentile(latencies, 50) * 1e6, 2),
+        "p95_us": round(percentile(latencies, 95) * 1e6, 2),
+        "p99_us": round(percentile(latencies, 99) * 1e6, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark for the loan matching order book.")
+    parser.add_argument("--orders", type=int, default=100000, help="Open orders to preload (half requests, half offers).")
+    parser.add_argument("--events", type=int, default=20000, help="Arriving orders / cancels to time.")
+    parser.add_argument("--verify", type=int, default=50, help="Lookups to check against a brute-force scan (each is a full scan).")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", help="Also write the results to this JSON file.")
+    parser.add_argument("--max-p99-us", type=float, help="Exit 1 if any operation's p99 exceeds this.")
+    args = parser.parse_args()
+
+    generator = OrderGenerator(args.seed)
+    book = OrderBook()
+
+    # --- Preload the book without matching, so it really holds --orders open orders ---
+    started = time.perf_counter()
+    for i in range(args.orders):
+        book.add_request(generator.request()) if i % 2 else book.add_offer(generator.offer())
+    load_seconds = time.perf_counter() - started
+
+    # --- Correctness against a linear scan ---
+    mismatches = 0
+    for _ in range(args.verify):
+        request, offer = generator.request(), generator.offer()
+        if book.best_offer(request) is not brute_force_best_offer(book, request):
+            mismatches += 1
+        if book.best_request(offer) is not brute_force_best_request(book, offer):
+            mismatches += 1
+
+    # --- Timed event stream: arrivals on both sides plus cancels ---
+    latencies = {"submit_request": [], "submit_offer": [], "cancel": []}
+    matched = 0
+    rng = random.Random(args.seed + 1)
+    open_ids = list(book.requests) + list(book.offers)
+    for _ in range(args.events):
+        kind = rng.random()
+        if kind < 0.4:
+            order = generator.request()
+            t0 = time.perf_counter()
+            result = book.submit_request(order)
+            latencies["submit_request"].append(time.perf_counter() - t0)
+        elif kind < 0.8:
+            order = generator.offer()
+            t0 = time.perf_counter()
+            result = book.submit_offer(order)
+            latencies["submit_offer"].append(time.perf_counter() - t0)
+        else:
+            order_id = open_ids[rng.randrange(len(open_ids))]
+            t0 = time.perf_counter()
+            book.cancel_request(order_id) if order_id.startswith("r") else book.cancel_offer(order_id)
+            latencies["cancel"].append(time.perf_counter() - t0)
+            continue
+        if result is None:
+            open_ids.append(order.id)
+        else:
+            matched += 1
+
+    results = [summarize(name, values) for name, values in latencies.items()]
+
+    print("\n--- Matching Benchmark ---")
+    print(f"Preloaded {args.orders} orders in {load_seconds:.2f}s; {len(book)} open at the end; {matched} matches.")
+    print(f"Brute-force check: {mismatches} mismatches in {2 * args.verify} lookups.")
+    header = f"{'operation':<16}{'count':>8}{'ops/s':>12}{'p50 us':>10}{'p95 us':>10}{'p99 us':>10}"
+    print(header)
+    print("-" * len(header))
+    for row in results:
+        print(f"{row['operation']:<16}{row['count']:>8}{row['ops_per_s']:>12.1f}{row['p50_us']:>10.2f}{row['p95_us']:>10.2f}{row['p99_us']:>10.2f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"config": vars(args), "load_seconds": load_seconds, "mismatches": mismatches, "results": results}, f, indent=2)
+
+    failed_gates = []
+    if mismatches:
+        failed_gates.append(f"{mismatches} lookups disagree with the brute-force scan")
+    for row in results:
+        if args.max_p99_us is not None and row["p99_us"] > args.max_p99_us:
+            failed_gates.append(f"{row['operation']}: p99 {row['p99_us']} us > {args.max_p99_us} us")
+    for message in failed_gates:
+        print(f"FAILED: {message}")
+    return 1 if failed_gates else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+# bench_portfolio.py
+#
+# Benchmark for portfolio_analytics: writes a synthetic columnar snapshot of
+# millions of loans, then times a full report over the memory-mapped columns.
+#
+#   python backend/benchmarks/bench_portfolio.py --loans 5000000
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from portfolio_analytics import LoanColumns, UNSCORED, portfolio_report
+
+STATUSES = ["active", "repaid", "closed", "defaulted"]
+
+
+def synthetic_loan_columns(loans: int, lenders: int, borrowers: int, seed: int, now: float):
+    """Random but plausible loan columns, generated directly as arrays."""
+    rng = np.random.default_rng(seed)
+    principal = rng.choice([100.0, 250.0, 500.0, 1000.0, 2500.0, 5000.0], loans)
+    interest_rate = rng.choice(np.arange(3.0, 15.25, 0.25), loans)
+    start_ts = (now - rng.integers(0, 365 * 86400, loans)).astype(np.int64)
+    borrower_scores = np.where(rng.random(borrowers) < 0.05, UNSCORED, rng.integers(300, 851, borrowers)).astype(np.int16)
+    borrower = rng.integers(0, borrowers, loans, dtype=np.int32)
+
+    columns = {
+        "principal": principal,
+        "interest_rate": interest_rate,
+        "total_repayment": principal * (1 + interest_rate / 100),
+        "start_ts": start_ts,
+        "due_ts": start_ts + rng.choice([7, 14, 30, 60, 90, 180], loans) * 86400,
+        "status": rng.choice(len(STATUSES), loans, p=[0.5, 0.25, 0.2, 0.05]).astype(np.int16),
+        "lender": rng.integers(0, lenders, loans, dtype=np.int32),
+        "borrower": borrower,
+        "borrower_score": borrower_scores[borrower],
+    }
+    return LoanColumns(
+        columns,
+        ["0x%040x" % i for i in range(lenders)],
+        ["0x%040x" % (10 ** 9 + i) for i in range(borrowers)],
+        STATUSES,
+        now,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark for columnar portfolio analytics.")
+    parser.add_argument("--loans", type=int, default=2_000_000)
+    parser.add_argument("--lenders", type=int, default=20_000)
+    parser.add_argument("--borrowers", type=int, default=200_000)
+    parser.add_argument("--seed", type=int, default=3)
+    parser.add_argument("--max-seconds", type=float, help="Exit 1 if the report takes longer than this.")
+    args = parser.parse_args()
+
+    now = time.time()
+    directory = tempfile.mkdtemp(prefix="bench_portfolio_")
+    try:
+        started = time.perf_counter()
+        synthetic_loan_columns(args.loans, args.lenders, args.borrowers, args.seed, now).save(directory)
+        write_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        loans = LoanColumns.load(directory)
+        report = portfolio_report(loans, now)
+        report_seconds = time.perf_counter() - started
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    print("\n--- Portfolio Analytics Benchmark ---")
+    print(f"Loans: {report['loans']}, lenders: {args.lenders}, borrowers: {args.borrowers}")
+    print(f"Snapshot write: {write_seconds:.2f}s")
+    print(f"Load (mmap) + full report: {report_seconds:.2f}s")
+    print(f"Outstanding: {report['amount_outstanding']:.2f}, overdue: {report['amount_overdue']:.2f}, "
+          f"expected yield: {report['expected_yield']:.2f}")
+
+    if args.max_seconds is not None and report_seconds > args.max_seconds:
+        print(f"FAILED: report took {report_seconds:.2f}s > {args.max_seconds}s")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,242 @@
+# bench_scoring.py
+#
+# Offline benchmark for get_wallet_risk_score (single-wallet path) and the
+# update_scores worker pool (batch path), run against local fake Etherscan
+# and JSON-RPC servers so it needs no network access or API keys.
+#
+#   python backend/benchmarks/bench_scoring.py --wallets 200 --max-txs 100000 --latency-ms 40
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import contextlib
+import tracemalloc
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_providers import SyntheticWallets, FakeEtherscan, FakeRpc
+
+
+def _serve_fake_providers(conn, min_txs, max_txs, latency_ms, error_rate):
+    """Child-process entry point: runs both fake servers and reports their URLs."""
+    wallets = SyntheticWallets(min_txs, max_txs)
+    etherscan = FakeEtherscan(wallets, latency_ms=latency_ms, error_rate=error_rate).start()
+    rpc = FakeRpc(wallets, latency_ms=latency_ms, error_rate=error_rate).start()
+    conn.send((etherscan.url + "/api", rpc.url))
+    conn.recv()  # Block until the parent says stop
+    etherscan.stop()
+    rpc.stop()
+
+
+def start_fake_providers(args):
+    """
+    Starts the fake servers in a separate process, so their request handling
+    does not compete with the code under test for the GIL.
+
+    Returns:
+        (tuple): (stop function, Etherscan URL, RPC URL)
+    """
+    parent_conn, child_conn = multiprocessing.Pipe()
+    process = multiprocessing.Process(
+        target=_serve_fake_providers,
+        args=(child_conn, args.min_txs, args.max_txs, args.latency_ms, args.error_rate),
+        daemon=True,
+    )
+    process.start()
+    etherscan_url, rpc_url = parent_conn.recv()
+
+    def stop():
+        parent_conn.send("stop")
+        process.join(timeout=5)
+
+    return stop, etherscan_url, rpc_url
+
+
+def percentile(sorted_values: list, pct: float):
+    """Nearest-rank percentile of an already sorted list (0 if empty)."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def summarize(name: str, latencies: list, failures: int, elapsed: float, peak_bytes):
+    """Builds the report row for one benchmarked path."""
+    latencies = sorted(latencies)
+    count = len(latencies)
+    return {
+        "path": name,
+        "wallets": count,
+        "failed": failures,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_wallets_per_s": round(count / elapsed, 2) if elapsed > 0 else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "peak_memory_mb": round(peak_bytes / 2 ** 20, 2) if peak_bytes is not None else None,
+    }
+
+
+@contextlib.contextmanager
+def measure_peak_memory(enabled: bool):
+    """Yields a dict whose "peak" is filled with tracemalloc's peak on exit."""
+    result = {"peak": None}
+    if enabled:
+        tracemalloc.start()
+    try:
+        yield result
+    finally:
+        if enabled:
+            result["peak"] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+
+def warm_up(scoring_logic, wallet: str):
+    """
+    Scores one throwaway wallet, so the lazy web3/aiohttp imports, the first
+    health check and connection setup are not charged to the measured path.
+    """
+    try:
+        scoring_logic.get_wallet_risk_score(wallet, (0, 0))
+    except Exception as e:
+        print(f"WARNING: Warm-up wallet failed. {e}")
+
+
+def bench_single(scoring_logic, wallets: list, trace_memory: bool, warmup_wallet: str):
+    """Scores wallets one after another through the blocking API."""
+    warm_up(scoring_logic, warmup_wallet)
+    latencies, failures = [], 0
+    with measure_peak_memory(trace_memory) as memory:
+        started = time.perf_counter()
+        for wallet in wallets:
+            t0 = time.perf_counter()
+            try:
+                scoring_logic.get_wallet_risk_score(wallet, (0, 0))
+            except Exception:
+                failures += 1
+            latencies.append(time.perf_counter() - t0)
+        elapsed = time.perf_counter() - started
+    return summarize("single", latencies, failures, elapsed, memory["peak"])
+
+
+def bench_batch(scoring_logic, update_scores, wallets: list, workers: int, trace_memory: bool, warmup_wallet: str):
+    """Scores wallets through update_scores' worker pool and write-behind buffer."""
+    from score_writer import ScoreWriter
+
+    warm_up(scoring_logic, warmup_wallet)
+
+    latencies = []
+    original_score_wallet = update_scores.score_wallet
+
+    def timed_score_wallet(wallet_id, repayment_history=None):
+        t0 = time.perf_counter()
+        try:
+            return original_score_wallet(wallet_id, repayment_history)
+        finally:
+            latencies.append(time.perf_counter() - t0)
+
+    def accept_rows(rows: list):
+        # Stands in for the users table: reports every row as updated and does nothing
+        return [row[update_scores.WALLET_COLUMN] for row in rows]
+
+    update_scores.score_wallet = timed_score_wallet
+    try:
+        with measure_peak_memory(trace_memory) as memory:
+            started = time.perf_counter()
+            writer = ScoreWriter(accept_rows, update_scores.WALLET_COLUMN)
+            with writer, ThreadPoolExecutor(max_workers=workers) as executor:
+                failures = update_scores.score_wallets(executor, writer, wallets, {wallet: (0, 0) for wallet in wallets})
+            elapsed = time.perf_counter() - started
+    finally:
+        update_scores.score_wallet = original_score_wallet
+
+    return summarize(f"batch (workers={workers})", latencies, failures, elapsed, memory["peak"])
+
+
+def print_report(results: list, config: dict):
+    print("\n--- Scoring Benchmark ---")
+    print("Config: " + ", ".join(f"{key}={value}" for key, value in config.items()))
+    header = f"{'path':<20}{'wallets':>8}{'failed':>8}{'wallets/s':>11}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'peak MB':>10}"
+    print(header)
+    print("-" * len(header))
+    for row in results:
+        peak = "-" if row["peak_memory_mb"] is None else f"{row['peak_memory_mb']:.2f}"
+        print(f"{row['path']:<20}{row['wallets']:>8}{row['failed']:>8}{row['throughput_wallets_per_s']:>11.2f}"
+              f"{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}{row['p99_ms']:>10.2f}{peak:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark for wallet scoring.")
+    parser.add_argument("--wallets", type=int, default=100, help="Synthetic wallets per path.")
+    parser.add_argument("--min-txs", type=int, default=0, help="Smallest wallet history.")
+    parser.add_argument("--max-txs", type=int, default=5000, help="Largest wallet history (up to 100k+).")
+    parser.add_argument("--latency-ms", type=float, default=20, help="Latency added to every fake upstream call.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of upstream calls that fail with HTTP 500.")
+    parser.add_argument("--workers", type=int, default=16, help="Worker pool size for the batch path.")
+    parser.add_argument("--etherscan-rps", type=float, default=0, help="Etherscan rate limit to apply (0 = unlimited).")
+    parser.add_argument("--paths", default="single,batch", help="Comma-separated paths to run.")
+    parser.add_argument("--no-trace-memory", action="store_true", help="Skip tracemalloc peak-memory tracking.")
+    parser.add_argument("--json", help="Also write the results to this JSON file.")
+    parser.add_argument("--max-p95-ms", type=float, help="Exit 1 if any path's p95 latency exceeds this.")
+    parser.add_argument("--min-throughput", type=float, help="Exit 1 if any path's wallets/s falls below this.")
+    args = parser.parse_args()
+
+    stop_providers, etherscan_url, rpc_url = start_fake_providers(args)
+    workdir = tempfile.mkdtemp(prefix="bench_scoring_")
+
+    # --- Point the scoring code at the fakes before it reads its config ---
+    os.environ.update({
+        "ETH_RPC_ENDPOINT": rpc_url,
+        "ETHERSCAN_API_URL": etherscan_url,
+        "ETHERSCAN_API_KEY": "offline-benchmark",
+        "ETHERSCAN_CALLS_PER_SECOND": str(args.etherscan_rps),
+        "RPC_CALLS_PER_SECOND": "0",
+        "FEATURE_CACHE": "off",
+        "WALLET_HISTORY_PATH": os.path.join(workdir, "wallet_history.sqlite3"),
+    })
+
+    import scoring_logic
+    import update_scores
+
+    paths = [path.strip() for path in args.paths.split(",") if path.strip()]
+    results = []
+    try:
+        # Separate address ranges per path (and per warm-up wallet), so no
+        # path reuses the checkpoints another one just wrote
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            if "single" in paths:
+                wallets = ["0x%040x" % (i + 1) for i in range(args.wallets)]
+                results.append(bench_single(scoring_logic, wallets, not args.no_trace_memory, "0x%040x" % (2 * 10 ** 6)))
+            if "batch" in paths:
+                wallets = ["0x%040x" % (10 ** 6 + i) for i in range(args.wallets)]
+                results.append(bench_batch(scoring_logic, update_scores, wallets, args.workers, not args.no_trace_memory, "0x%040x" % (2 * 10 ** 6 + 1)))
+    finally:
+        stop_providers()
+
+    config = {key: getattr(args, key) for key in ("wallets", "min_txs", "max_txs", "latency_ms", "error_rate", "workers", "etherscan_rps")}
+    print_report(results, config)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"config": config, "results": results}, f, indent=2)
+
+    failed_gates = []
+    for row in results:
+        if args.max_p95_ms is not None and row["p95_ms"] > args.max_p95_ms:
+            failed_gates.append(f"{row['path']}: p95 {row['p95_ms']} ms > {args.max_p95_ms} ms")
+        if args.min_throughput is not None and row["throughput_wallets_per_s"] < args.min_throughput:
+            failed_gates.append(f"{row['path']}: {row['throughput_wallets_per_s']} wallets/s < {args.min_throughput}")
+    for message in failed_gates:
+        print(f"FAILED: {message}")
+    return 1 if failed_gates else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+# check_equivalence.py
+#
+# Guards the vectorised rewrites against drifting from the code they replaced:
+# compares them with the original scalar logic on random (seeded) inputs and
+# exits 1 if any result differs.
+#
+#   python backend/benchmarks/check_equivalence.py --samples 200000
+
+import os
+import sys
+import random
+import argparse
+from datetime import datetime, timezone
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from scoring_kernel import WEIGHTS, build_feature_matrix, score_features, score_feature_records, feature_record
+from loan_calculator import get_max_loan_amount, get_max_loan_amounts
+
+# Scores on both sides of every max-loan tier boundary, always checked
+TIER_EDGE_SCORES = (300, 399, 400, 549, 550, 699, 700, 850)
+
+
+def baseline_score(analysis: dict):
+    """The original per-wallet scoring arithmetic, as a reference."""
+    score = 0
+    score += analysis["platform_good_loans"] * WEIGHTS["platform_repayment_good"]
+    score += analysis["platform_defaulted_loans"] * WEIGHTS["platform_repayment_bad"]
+    score += min(float(analysis["eth_balance"]) * WEIGHTS["eth_balance"], 200)
+    if analysis["transaction_count"] > 0:
+        score += analysis["wallet_age_days"] * WEIGHTS["wallet_age_days"] + analysis["transaction_count"] * WEIGHTS["tx_count"]
+    score += analysis["erc20_token_variety_count"] * WEIGHTS["erc20_token_count"]
+
+    final_score = round(max(300, min(850, 300 + score)))
+    risk_level = "low" if final_score > 700 else "medium" if final_score > 550 else "high"
+    return final_score, risk_level
+
+
+def random_analysis(rng: random.Random, now: float):
+    """A plausible analysis_breakdown, consistent with how the online path fills it."""
+    # Mostly young, light wallets, so scores spread over every tier rather than all clamping at 850
+    tx_count = 0 if rng.random() < 0.2 else int(rng.paretovariate(1.2))
+    first_tx_timestamp = int(now - rng.expovariate(1 / (60 * 86400))) if tx_count else None
+    wallet_age_days = 0
+    if tx_count:
+        wallet_age_days = (datetime.fromtimestamp(now, timezone.utc) - datetime.fromtimestamp(first_tx_timestamp, timezone.utc)).days
+    return {
+        "platform_good_loans": rng.choice((0, 0, 0, 1, 2, 3, 5)),
+        "platform_defaulted_loans": rng.choice((0, 0, 0, 0, 1, 2)),
+        # Mix of dust, typical and capped balances
+        "eth_balance": rng.choice((0.0, rng.uniform(0, 0.01), rng.lognormvariate(-1, 2), rng.uniform(3, 100))),
+        "wallet_age_days": wallet_age_days,
+        "transaction_count": tx_count,
+        "erc20_token_variety_count": rng.choice((0, 0, 1, 2, 5, 12, 40)),
+        "first_tx_timestamp": first_tx_timestamp,
+    }
+
+
+def check_scoring_kernel(samples: int, seed: int):
+    """
+    Compares the vectorised kernel with baseline_score(), and the offline
+    re-score from saved feature records with the online score_analysis().
+
+    Returns:
+        (list): Mismatch descriptions (empty if everything matches).
+    """
+    import scoring_logic
+
+    rng = random.Random(seed)
+    now = float(int(datetime.now(timezone.utc).timestamp()))
+    analyses = [random_analysis(rng, now) for _ in range(samples)]
+    mismatches = []
+
+    scores, risk_levels = score_features(build_feature_matrix(analyses))
+    for analysis, score, risk_level in zip(analyses, scores, risk_levels):
+        expected = baseline_score(analysis)
+        if (int(score), str(risk_level)) != expected:
+            mismatches.append(f"kernel gave {(int(score), str(risk_level))}, baseline {expected} for {analysis}")
+
+    offline_scores, offline_levels = score_feature_records([feature_record(analysis) for analysis in analyses], now=now)
+    for analysis, score, risk_level in zip(analyses, offline_scores, offline_levels):
+        online = scoring_logic.score_analysis("0x0", analysis)
+        if (int(score), str(risk_level)) != (online["score"], online["risk_level"]):
+            mismatches.append(f"re-score gave {(int(score), str(risk_level))}, online {(online['score'], online['risk_level'])} for {analysis}")
+    return mismatches
+
+
+def baseline_max_loan(risk_score: float, good_loans: int, defaulted_loans: int):
+    """The original if/elif max-loan chain, as a reference."""
+    if risk_score < 400:
+        base_cap = 50
+    elif risk_score < 550:
+        base_cap = 250
+    elif risk_score < 700:
+        base_cap = 1000
+    else:
+        base_cap = 5000
+
+    multiplier = 1.0
+    if defaulted_loans > 0:
+        multiplier = 0.1
+    elif good_loans > 0:
+        multiplier = 1.0 + (good_loans * 0.5)
+    return int(base_cap * multiplier)
+
+
+def check_max_loan_amounts(samples: int, seed: int):
+    """
+    Compares get_max_loan_amounts() with get_max_loan_amount() and the
+    original if/elif chain, on every tier edge plus random scores.
+
+    Returns:
+        (list): Mismatch descriptions (empty if everything matches).
+    """
+    rng = random.Random(seed)
+    histories = [(good, defaulted) for good in range(7) for defaulted in range(3)]
+    cases = [(score, good, defaulted) for score in TIER_EDGE_SCORES for good, defaulted in histories]
+    cases += [(rng.randint(300, 850), *rng.choice(histories)) for _ in range(samples)]
+
+    scores, good_loans, defaulted_loans = zip(*cases)
+    amounts = get_max_loan_amounts(scores, good_loans, defaulted_loans)
+    mismatches = []
+    for (score, good, defaulted), amount in zip(cases, amounts):
+        single = get_max_loan_amount({"score": score, "analysis_breakdown": {"platform_good_loans": good, "platform_defaulted_loans": defaulted}})
+        expected = baseline_max_loan(score, good, defaulted)
+        if not int(amount) == single == expected:
+            mismatches.append(f"batch gave {int(amount)}, single {single}, baseline {expected} for score {score}, {good} good, {defaulted} defaulted")
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check vectorised code paths against the scalar code they replaced.")
+    parser.add_argument("--samples", type=int, default=20000, help="Random inputs per check.")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    failed = False
+    for name, check in (("scoring kernel", check_scoring_kernel), ("max loan amounts", check_max_loan_amounts)):
+        mismatches = check(args.samples, args.seed)
+        print(f"{name}: {args.samples} samples, {len(mismatches)} mismatches")
+        for message in mismatches[:5]:
+            print(f"FAILED: {message}")
+        failed = failed or bool(mismatches)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
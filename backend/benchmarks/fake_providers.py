@@ -0,0 +1,240 @@
+# fake_providers.py
+
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+# --- Synthetic Chain Config ---
+GENESIS_BLOCK = 1_000_000
+GENESIS_TIMESTAMP = 1_600_000_000
+SECONDS_PER_BLOCK = 12
+TOKEN_SYMBOLS = [f"TKN{i}" for i in range(50)]
+ETHERSCAN_RESULT_WINDOW = 10000
+
+
+class SyntheticWallets:
+    """
+    Deterministic, never-materialised wallet histories.
+
+    Each address gets a tx count drawn log-uniformly from [min_txs, max_txs]
+    (seeded by the address), and rows are generated on demand for whatever
+    slice a request asks for, so a 100k-tx wallet costs no memory.
+
+    Args:
+        min_txs (int): Smallest history size.
+        max_txs (int): Largest history size.
+        rows_per_block (int): Rows the wallet has in each block it touches.
+    """
+    def __init__(self, min_txs: int = 0, max_txs: int = 1000, rows_per_block: int = 2):
+        self.min_txs = min_txs
+        self.max_txs = max(min_txs, max_txs)
+        self.rows_per_block = max(1, rows_per_block)
+
+    def _seed(self, address: str):
+        return int.from_bytes(hashlib.sha1(address.lower().encode()).digest()[:8], "big")
+
+    def tx_count(self, address: str):
+        rng = random.Random(self._seed(address))
+        low, high = self.min_txs + 1, self.max_txs + 1
+        return int(round(low * (high / low) ** rng.random())) - 1
+
+    def token_count(self, address: str):
+        return self.tx_count(address) // 2
+
+    def balance_wei(self, address: str):
+        return random.Random(self._seed(address) ^ 0xBA1).randrange(0, 10 * 10 ** 18)
+
+    def rows(self, address: str, action: str, start_block: int, page: int, offset: int):
+        """Returns the rows Etherscan would for one paged account query."""
+        total = self.token_count(address) if action == "tokentx" else self.tx_count(address)
+        first = max(0, (start_block - GENESIS_BLOCK) * self.rows_per_block)
+        window_end = min(total, first + ETHERSCAN_RESULT_WINDOW)
+        start = first + (page - 1) * offset
+        end = min(window_end, start + offset)
+
+        result = []
+        for i in range(start, end):
+            block = GENESIS_BLOCK + i // self.rows_per_block
+            row = {
+                "blockNumber": str(block),
+                "timeStamp": str(GENESIS_TIMESTAMP + (block - GENESIS_BLOCK) * SECONDS_PER_BLOCK),
+                "hash": "0x%064x" % (self._seed(address) + i),
+                "from": address.lower(),
+                "to": "0x%040x" % i,
+                "value": str(i),
+            }
+            if action == "tokentx":
+                row["tokenSymbol"] = TOKEN_SYMBOLS[i % len(TOKEN_SYMBOLS)]
+                row["contractAddress"] = "0x%040x" % (i % len(TOKEN_SYMBOLS))
+            result.append(row)
+        return result
+
+
+class _FakeServer:
+    """Shared plumbing: a threaded HTTP server with injected latency and errors."""
+    def __init__(self, handler_class, host: str, port: int, latency_ms: float, error_rate: float, seed: int):
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.requests = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+        fake = self
+
+        class Handler(handler_class):
+            server_state = fake
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def before_request(self):
+        """Counts the request, sleeps for the latency, and decides whether to fail it."""
+        with self._lock:
+            self.requests += 1
+            fail = self._rng.random() < self.error_rate
+        if self.latency_ms > 0:
+            time.sleep(self.latency_ms / 1000)
+        return fail
+
+
+class _BaseHandler(BaseHTTPRequestHandler):
+    server_state = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str = "application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error_page(self):
+        self._send(500, b"Internal Server Error", "text/plain")
+
+
+class _EtherscanHandler(_BaseHandler):
+    def do_GET(self):
+        state = self.server_state
+        if state.before_request():
+            return self._send_error_page()
+
+        params = {key: values[0] for key, values in parse_qs(urlparse(self.path).query).items()}
+        page = int(params.get("page", 1))
+        offset = int(params.get("offset", ETHERSCAN_RESULT_WINDOW))
+        if page * offset > ETHERSCAN_RESULT_WINDOW:
+            payload = {"status": "0", "message": "NOTOK", "result": "Result window is too large, PageNo x Offset size must be less than or equal to 10000"}
+        else:
+            rows = state.wallets.rows(params.get("address", ""), params.get("action"), int(params.get("startblock", 0)), page, offset)
+            payload = {"status": "1", "message": "OK", "result": rows} if rows else {"status": "0", "message": "No transactions found", "result": []}
+        self._send(200, json.dumps(payload).encode())
+
+
+class _RpcHandler(_BaseHandler):
+    def do_POST(self):
+        state = self.server_state
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"null")
+        if state.before_request():
+            return self._send_error_page()
+
+        if isinstance(request, list):
+            response = [self._answer(call) for call in request]
+        else:
+            response = self._answer(request)
+        self._send(200, json.dumps(response).encode())
+
+    def _answer(self, call: dict):
+        method, params = call.get("method"), call.get("params") or []
+        if method == "eth_getBalance":
+            result = hex(self.server_state.wallets.balance_wei(params[0]))
+        elif method == "eth_blockNumber":
+            result = hex(GENESIS_BLOCK + 10_000_000)
+        elif method in ("eth_chainId", "net_version"):
+            result = "0xaa36a7" if method == "eth_chainId" else "11155111"
+        elif method == "web3_clientVersion":
+            result = "fake-rpc/1.0"
+        else:
+            return {"jsonrpc": "2.0", "id": call.get("id"), "error": {"code": -32601, "message": f"Method {method} not supported by fake RPC"}}
+        return {"jsonrpc": "2.0", "id": call.get("id"), "result": result}
+
+
+class FakeEtherscan(_FakeServer):
+    """
+    Local stand-in for the Etherscan account API (txlist / tokentx with
+    startblock, page and offset, including the 10,000-row window cap).
+
+    Args:
+        wallets (SyntheticWallets): History generator.
+        host (str): Bind address.
+        port (int): Bind port (0 picks a free one).
+        latency_ms (float): Delay added to every request.
+        error_rate (float): Fraction of requests answered with HTTP 500.
+        seed (int): Seed for the error injection.
+    """
+    def __init__(self, wallets: SyntheticWallets, host: str = "127.0.0.1", port: int = 0,
+                 latency_ms: float = 0, error_rate: float = 0.0, seed: int = 1):
+        super().__init__(_EtherscanHandler, host, port, latency_ms, error_rate, seed)
+        self.wallets = wallets
+
+
+class FakeRpc(_FakeServer):
+    """
+    Local stand-in for an Ethereum JSON-RPC node (single and batched calls).
+
+    Args:
+        wallets (SyntheticWallets): Balance generator.
+        host (str): Bind address.
+        port (int): Bind port (0 picks a free one).
+        latency_ms (float): Delay added to every request.
+        error_rate (float): Fraction of requests answered with HTTP 500.
+        seed (int): Seed for the error injection.
+    """
+    def __init__(self, wallets: SyntheticWallets, host: str = "127.0.0.1", port: int = 0,
+                 latency_ms: float = 0, error_rate: float = 0.0, seed: int = 2):
+        super().__init__(_RpcHandler, host, port, latency_ms, error_rate, seed)
+        self.wallets = wallets
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run fake Etherscan + JSON-RPC servers for offline testing.")
+    parser.add_argument("--etherscan-port", type=int, default=8545 + 1)
+    parser.add_argument("--rpc-port", type=int, default=8545)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--min-txs", type=int, default=0)
+    parser.add_argument("--max-txs", type=int, default=1000)
+    args = parser.parse_args()
+
+    wallets = SyntheticWallets(args.min_txs, args.max_txs)
+    etherscan = FakeEtherscan(wallets, port=args.etherscan_port, latency_ms=args.latency_ms, error_rate=args.error_rate).start()
+    rpc = FakeRpc(wallets, port=args.rpc_port, latency_ms=args.latency_ms, error_rate=args.error_rate).start()
+    print(f"Fake Etherscan: {etherscan.url}/api")
+    print(f"Fake RPC:       {rpc.url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        etherscan.stop()
+        rpc.stop()
@@ -0,0 +1,243 @@
+# feature_cache.py
+
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# --- Default Time-To-Live per feature (seconds) ---
+# Balances move fastest; history summaries only grow, so they can live longer.
+FEATURE_TTLS = {
+    "balance": 300,
+    "tx_summary": 3600,
+    "token_set": 3600,
+}
+DEFAULT_TTL = 600
+
+# The SQLite backend purges expired rows on open and every this many writes,
+# then trims itself to its row cap (soonest-expiring rows go first)
+SQLITE_MAX_ROWS = 200000
+SQLITE_PURGE_EVERY_WRITES = 1000
+
+
+class FeatureCache:
+    """
+    Base class for the raw on-chain input cache used by scoring_logic.
+
+    Entries are keyed by (checksum address, feature name) and hold any
+    JSON-serialisable value. Subclasses implement _load / _store / _delete;
+    this class handles TTLs and the hit/miss counters.
+
+    Args:
+        ttls (dict): Per-feature TTL overrides, merged over FEATURE_TTLS.
+    """
+    def __init__(self, ttls: dict = None):
+        self.ttls = {**FEATURE_TTLS, **(ttls or {})}
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    def get(self, address: str, feature: str):
+        """Returns the cached value, or None if it is missing or expired."""
+        entry = self._load(address, feature)
+        if entry is not None and entry[0] <= time.time():
+            self._delete(address, feature)
+            entry = None
+
+        with self._stats_lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return entry[1]
+
+    def set(self, address: str, feature: str, value, ttl: float = None):
+        """Stores a value for `ttl` seconds (defaults to the feature's TTL)."""
+        if ttl is None:
+            ttl = self.ttls.get(feature, DEFAULT_TTL)
+        self._store(address, feature, value, time.time() + ttl)
+
+    def invalidate(self, address: str, features=None):
+        """Drops cached features for a wallet (all known features by default)."""
+        for feature in (features or self.ttls):
+            self._delete(address, feature)
+
+    def stats(self):
+        """Returns hit/miss counters and the hit rate."""
+        with self._stats_lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / total) if total else 0.0,
+            }
+
+    def _load(self, address, feature):
+        raise NotImplementedError
+
+    def _store(self, address, feature, value, expires_at):
+        raise NotImplementedError
+
+    def _delete(self, address, feature):
+        raise NotImplementedError
+
+
+class NullFeatureCache(FeatureCache):
+    """A cache that never stores anything (caching disabled)."""
+    def _load(self, address, feature):
+        return None
+
+    def _store(self, address, feature, value, expires_at):
+        pass
+
+    def _delete(self, address, feature):
+        pass
+
+
+class MemoryFeatureCache(FeatureCache):
+    """
+    In-process LRU cache bounded by the approximate size of its entries.
+
+    Entry size is measured as the length of the JSON-encoded value, which is
+    a cheap, stable proxy for the memory it holds.
+
+    Args:
+        max_bytes (int): Evict least-recently-used entries beyond this size.
+        ttls (dict): Per-feature TTL overrides.
+    """
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024, ttls: dict = None):
+        super().__init__(ttls)
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _load(self, address, feature):
+        with self._lock:
+            entry = self._entries.get((address, feature))
+            if entry is None:
+                return None
+            self._entries.move_to_end((address, feature))
+            return entry[0], entry[1]
+
+    def _store(self, address, feature, value, expires_at):
+        size = len(json.dumps(value))
+        with self._lock:
+            old = self._entries.pop((address, feature), None)
+            if old is not None:
+                self.current_bytes -= old[2]
+            self._entries[(address, feature)] = (expires_at, value, size)
+            self.current_bytes += size
+
+            while self.current_bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= evicted[2]
+
+    def _delete(self, address, feature):
+        with self._lock:
+            old = self._entries.pop((address, feature), None)
+            if old is not None:
+                self.current_bytes -= old[2]
+
+
+class SQLiteFeatureCache(FeatureCache):
+    """
+    On-disk cache backed by a local SQLite file, so entries survive restarts
+    and can be shared by several worker processes on the same host.
+
+    Expired rows are purged when the file is opened and every
+    SQLITE_PURGE_EVERY_WRITES writes; the file is then trimmed to `max_rows`
+    by dropping the rows closest to expiry.
+
+    Args:
+        path (str): SQLite database file.
+        ttls (dict): Per-feature TTL overrides.
+        max_rows (int): Most rows kept on disk.
+    """
+    def __init__(self, path: str = "feature_cache.sqlite3", ttls: dict = None, max_rows: int = SQLITE_MAX_ROWS):
+        super().__init__(ttls)
+        self.path = path
+        self.max_rows = max(1, max_rows)
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS feature_cache ("
+                " address TEXT NOT NULL,"
+                " feature TEXT NOT NULL,"
+                " value TEXT NOT NULL,"
+                " expires_at REAL NOT NULL,"
+                " PRIMARY KEY (address, feature))"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS feature_cache_expires_at ON feature_cache (expires_at)")
+        self.purge_expired()
+
+    def _load(self, address, feature):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT expires_at, value FROM feature_cache WHERE address = ? AND feature = ?",
+                (address, feature),
+            ).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def _store(self, address, feature, value, expires_at):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO feature_cache (address, feature, value, expires_at) VALUES (?, ?, ?, ?)",
+                (address, feature, json.dumps(value), expires_at),
+            )
+            self._writes += 1
+            purge_due = self._writes % SQLITE_PURGE_EVERY_WRITES == 0
+        if purge_due:
+            self.purge_expired()
+
+    def _delete(self, address, feature):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM feature_cache WHERE address = ? AND feature = ?", (address, feature))
+
+    def purge_expired(self):
+        """
+        Deletes every expired row, then the rows closest to expiry beyond
+        max_rows. Returns how many were removed.
+        """
+        with self._lock, self._conn:
+            removed = self._conn.execute("DELETE FROM feature_cache WHERE expires_at <= ?", (time.time(),)).rowcount
+            excess = self._conn.execute("SELECT COUNT(*) FROM feature_cache").fetchone()[0] - self.max_rows
+            if excess > 0:
+                removed += self._conn.execute(
+                    "DELETE FROM feature_cache WHERE rowid IN"
+                    " (SELECT rowid FROM feature_cache ORDER BY expires_at LIMIT ?)",
+                    (excess,),
+                ).rowcount
+        return removed
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def build_feature_cache(backend: str, path: str = None, max_rows: int = SQLITE_MAX_ROWS):
+    """
+    Builds a cache from a config string: "memory", "sqlite" or "off".
+
+    Args:
+        backend (str): Which backend to use.
+        path (str): SQLite file, only used by the "sqlite" backend.
+        max_rows (int): Row cap, only used by the "sqlite" backend.
+
+    Returns:
+        (FeatureCache): The configured cache.
+    """
+    backend = (backend or "memory").lower()
+    if backend == "off":
+        return NullFeatureCache()
+    if backend == "sqlite":
+        return SQLiteFeatureCache(path or "feature_cache.sqlite3", max_rows=max_rows)
+    if backend == "memory":
+        return MemoryFeatureCache()
+    raise Exception(f"Unknown feature cache backend '{backend}'. Use memory, sqlite or off.")
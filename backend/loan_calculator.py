@@ -1,5 +1,24 @@
 # loan_calculator.py
-from backend.scoring_logic import get_wallet_risk_score
+#
+# Pure arithmetic on already-computed scores: this module must not import
+# scoring_logic (web3, aiohttp, RPC clients), so the API layer can compute
+# caps cheaply.
+
+from bisect import bisect_right
+import numpy as np
+
+# --- Max Loan Tiers ---
+# A score below TIER_SCORE_BOUNDS[i] gets TIER_BASE_CAPS[i] (USD); 700+ gets the last cap
+TIER_SCORE_BOUNDS = (400, 550, 700)
+TIER_BASE_CAPS = (50, 250, 1000, 5000)  # High, Medium, Good, Low risk
+
+# --- Platform History Multipliers ---
+DEFAULT_MULTIPLIER = 0.1        # Any defaulted loan severely penalizes the cap
+GOOD_LOAN_MULTIPLIER_STEP = 0.5  # 1 good loan = 1.5x, 2 good loans = 2.0x, ...
+
+_TIER_SCORE_BOUNDS = np.array(TIER_SCORE_BOUNDS)
+_TIER_BASE_CAPS = np.array(TIER_BASE_CAPS, dtype=np.float64)
+
 
 def get_max_loan_amount(score_data: dict):
     """
@@ -8,42 +27,60 @@ def get_max_loan_amount(score_data: dict):
 
     Args:
         score_data (dict): The full dictionary output from get_wallet_risk_score().
-        
+
     Returns:
         (int): The maximum loan amount in USD.
     """
-    
+
     # --- 1. Get data from the score_data dictionary ---
     risk_score = score_data.get('score', 300)
     analysis = score_data.get('analysis_breakdown', {})
-    
+
     # This uses your *internal* platform data
     good_loans = analysis.get('platform_good_loans', 0)
     defaulted_loans = analysis.get('platform_defaulted_loans', 0)
-    
+
     # --- 2. Determine Base Cap from On-Chain Risk Score ---
-    base_cap = 0
-    if risk_score < 400:
-        base_cap = 50  # High-risk
-    elif risk_score < 550:
-        base_cap = 250 # Medium-risk
-    elif risk_score < 700:
-        base_cap = 1000 # Good-risk
-    else: # 700+
-        base_cap = 5000 # Low-risk
-        
+    base_cap = TIER_BASE_CAPS[bisect_right(TIER_SCORE_BOUNDS, risk_score)]
+
     # --- 3. Determine Multiplier from Platform History ---
     multiplier = 1.0
-    
+
     if defaulted_loans > 0:
-        multiplier = 0.1 # Severely penalize
+        multiplier = DEFAULT_MULTIPLIER
     elif good_loans > 0:
-        # 1 good loan = 1.5x multiplier
-        # 2 good loans = 2.0x multiplier
-        multiplier = 1.0 + (good_loans * 0.5)
-        
+        multiplier = 1.0 + (good_loans * GOOD_LOAN_MULTIPLIER_STEP)
+
     # --- 4. Calculate Final Max Loan ---
     max_loan = base_cap * multiplier
-    
+
     # Return a clean integer
-    return int(max_loan)
\ No newline at end of file
+    return int(max_loan)
+
+
+def get_max_loan_amounts(scores, good_loans, defaulted_loans):
+    """
+    Batch version of get_max_loan_amount(): one tier lookup and one
+    multiplier pass over whole arrays, for e.g. every borrower in a list.
+    Gives exactly the same amounts as calling get_max_loan_amount() per user.
+
+    Args:
+        scores (array-like): Risk scores.
+        good_loans (array-like): Repaid platform loans per user.
+        defaulted_loans (array-like): Defaulted platform loans per user.
+
+    Returns:
+        (np.ndarray): int64 max loan amounts in USD.
+    """
+    scores = np.asarray(scores)
+    good_loans = np.asarray(good_loans, dtype=np.float64)
+    defaulted_loans = np.asarray(defaulted_loans)
+
+    base_caps = _TIER_BASE_CAPS[np.searchsorted(_TIER_SCORE_BOUNDS, scores, side="right")]
+    multipliers = np.where(
+        defaulted_loans > 0,
+        DEFAULT_MULTIPLIER,
+        np.where(good_loans > 0, 1.0 + good_loans * GOOD_LOAN_MULTIPLIER_STEP, 1.0),
+    )
+    # Truncate toward zero, like int()
+    return (base_caps * multipliers).astype(np.int64)
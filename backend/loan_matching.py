@@ -0,0 +1,284 @@
+# loan_matching.py
+
+import os
+import itertools
+from bisect import bisect_left, bisect_right, insort
+import metrics
+from supabase_queries import iter_rows, load_risk_scores
+
+# --- Matching Config ---
+# Orders only match within the same duration bucket: a duration (in days)
+# falls in the first bucket whose upper bound is >= it (the last one is open).
+DURATION_BUCKETS_DAYS = (7, 14, 30, 60, 90, 180, 365, 730)
+# Offers are indexed by their minimum risk score (and requests by the
+# borrower's score) in levels this wide, so a lookup only visits the levels a
+# borrower qualifies for instead of every open order.
+SCORE_LEVEL_STEP = 50
+
+# Rows in these states are open orders when loading from Supabase. Only open
+# rows are read; the status filter wants an index on each table:
+#   CREATE INDEX IF NOT EXISTS loan_requests_status_idx ON loan_requests (status, id);
+#   CREATE INDEX IF NOT EXISTS loan_offers_status_idx ON loan_offers (status, id);
+OPEN_REQUEST_STATUSES = {"active"}
+OPEN_OFFER_STATUSES = {"active"}
+REQUESTS_TABLE = "loan_requests"
+OFFERS_TABLE = "loan_offers"
+REQUEST_COLUMNS = "id,borrower_id,amount,repayment_duration_days"
+OFFER_COLUMNS = "id,lender_id,amount,interest_rate,repayment_duration"
+# loan_offers has no minimum-score column yet; name it here once it does
+OFFER_MIN_SCORE_COLUMN = os.getenv("LOAN_OFFER_MIN_SCORE_COLUMN")
+
+
+def duration_bucket(days: float):
+    """Returns the index of the duration bucket holding `days`."""
+    return min(bisect_left(DURATION_BUCKETS_DAYS, days), len(DURATION_BUCKETS_DAYS) - 1)
+
+
+def score_level(score: float):
+    return int(score) // SCORE_LEVEL_STEP
+
+
+class LoanRequest:
+    """
+    A borrower asking for `amount` over `duration_days`.
+
+    Args:
+        id (str): loan_requests.id
+        borrower_id (str): Borrower wallet.
+        amount (float): Requested amount (USD).
+        duration_days (float): repayment_duration_days.
+        risk_score (float): The borrower's current risk score.
+    """
+    __slots__ = ("id", "borrower_id", "amount", "duration_days", "risk_score", "seq")
+
+    def __init__(self, id: str, borrower_id: str, amount: float, duration_days: float, risk_score: float):
+        self.id = id
+        self.borrower_id = borrower_id
+        self.amount = amount
+        self.duration_days = duration_days
+        self.risk_score = risk_score
+        self.seq = None
+
+    def __repr__(self):
+        return f"LoanRequest({self.id!r}, amount={self.amount}, days={self.duration_days}, score={self.risk_score})"
+
+
+class LoanOffer:
+    """
+    A lender offering up to `amount` at `interest_rate` over `duration_days`
+    to borrowers scoring at least `min_risk_score`.
+
+    Args:
+        id (str): loan_offers.id
+        lender_id (str): Lender wallet.
+        amount (float): Amount on offer (USD); must cover the whole request.
+        interest_rate (float): Interest rate (%).
+        duration_days (float): repayment_duration.
+        min_risk_score (float): Lowest borrower score the lender accepts.
+    """
+    __slots__ = ("id", "lender_id", "amount", "interest_rate", "duration_days", "min_risk_score", "seq")
+
+    def __init__(self, id: str, lender_id: str, amount: float, interest_rate: float, duration_days: float, min_risk_score: float = 0):
+        self.id = id
+        self.lender_id = lender_id
+        self.amount = amount
+        self.interest_rate = interest_rate
+        self.duration_days = duration_days
+        self.min_risk_score = min_risk_score
+        self.seq = None
+
+    def __repr__(self):
+        return (f"LoanOffer({self.id!r}, amount={self.amount}, rate={self.interest_rate}, "
+                f"days={self.duration_days}, min_score={self.min_risk_score})")
+
+
+class OrderBook:
+    """
+    In-memory book of open loan requests and offers.
+
+    Offers are indexed as bucket -> interest rate -> score level -> list
+    sorted by (amount, arrival); requests as bucket -> score level -> list
+    sorted by (amount, arrival). A lookup walks the (few) rates and score
+    levels that can match and bisects into each list, so its cost depends
+    on how many distinct rates and levels there are, not on how many orders
+    are open. Adding or cancelling an order is one bisect + list insert.
+
+    A request and an offer are compatible when they are in the same duration
+    bucket, the borrower's score is at least the offer's minimum, the offer
+    amount covers the request, and lender and borrower differ.
+    """
+    def __init__(self):
+        self.requests = {}  # id -> LoanRequest
+        self.offers = {}    # id -> LoanOffer
+        self._request_index = {}  # bucket -> {level: [(amount, seq, id)]}
+        self._offer_index = {}    # bucket -> {rate: {level: [(amount, seq, id)]}}
+        self._offer_rates = {}    # bucket -> sorted list of rates with open offers
+        self._seq = itertools.count()
+
+    def __len__(self):
+        return len(self.requests) + len(self.offers)
+
+    # --- Adding / Cancelling ---
+    def add_request(self, request: LoanRequest):
+        """Rests a request in the book (replacing any open request with the same id)."""
+        if request.id in self.requests:
+            self.cancel_request(request.id)
+        request.seq = next(self._seq)
+        levels = self._request_index.setdefault(duration_bucket(request.duration_days), {})
+        insort(levels.setdefault(score_level(request.risk_score), []), (request.amount, request.seq, request.id))
+        self.requests[request.id] = request
+
+    def add_offer(self, offer: LoanOffer):
+        """Rests an offer in the book (replacing any open offer with the same id)."""
+        if offer.id in self.offers:
+            self.cancel_offer(offer.id)
+        offer.seq = next(self._seq)
+        bucket = duration_bucket(offer.duration_days)
+        rates = self._offer_index.setdefault(bucket, {})
+        if offer.interest_rate not in rates:
+            rates[offer.interest_rate] = {}
+            insort(self._offer_rates.setdefault(bucket, []), offer.interest_rate)
+        insort(rates[offer.interest_rate].setdefault(score_level(offer.min_risk_score), []), (offer.amount, offer.seq, offer.id))
+        self.offers[offer.id] = offer
+
+    def cancel_request(self, request_id: str):
+        """Removes an open request. Returns it, or None if it was not open."""
+        request = self.requests.pop(request_id, None)
+        if request is None:
+            return None
+        bucket = duration_bucket(request.duration_days)
+        levels = self._request_index[bucket]
+        level = score_level(request.risk_score)
+        _remove(levels[level], (request.amount, request.seq, request.id))
+        if not levels[level]:
+            del levels[level]
+        return request
+
+    def cancel_offer(self, offer_id: str):
+        """Removes an open offer. Returns it, or None if it was not open."""
+        offer = self.offers.pop(offer_id, None)
+        if offer is None:
+            return None
+        bucket = duration_bucket(offer.duration_days)
+        levels = self._offer_index[bucket][offer.interest_rate]
+        level = score_level(offer.min_risk_score)
+        _remove(levels[level], (offer.amount, offer.seq, offer.id))
+        if not levels[level]:
+            del levels[level]
+        if not levels:
+            del self._offer_index[bucket][offer.interest_rate]
+            rates = self._offer_rates[bucket]
+            del rates[bisect_left(rates, offer.interest_rate)]
+        return offer
+
+    # --- Lookups ---
+    def best_offer(self, request: LoanRequest):
+        """
+        Returns the best open offer for a request, or None: the lowest
+        interest rate, then the smallest amount that covers the request,
+        then the oldest.
+        """
+        bucket = duration_bucket(request.duration_days)
+        rates = self._offer_index.get(bucket)
+        if not rates:
+            return None
+        borrower_level = score_level(request.risk_score)
+
+        for rate in self._offer_rates[bucket]:
+            best = None
+            for level, entries in rates[rate].items():
+                if level > borrower_level:
+                    continue
+                for i in range(bisect_left(entries, (request.amount,)), len(entries)):
+                    if best is not None and entries[i] >= best:
+                        break
+                    offer = self.offers[entries[i][2]]
+                    if offer.min_risk_score <= request.risk_score and offer.lender_id != request.borrower_id:
+                        best = entries[i]
+                        break
+            if best is not None:
+                return self.offers[best[2]]
+        return None
+
+    def best_request(self, offer: LoanOffer):
+        """
+        Returns the best open request for an offer, or None: the highest
+        score level, then the largest amount the offer covers, then the oldest.
+        """
+        levels = self._request_index.get(duration_bucket(offer.duration_days))
+        if not levels:
+            return None
+        min_level = score_level(offer.min_risk_score)
+
+        for level in sorted(levels, reverse=True):
+            if level < min_level:
+                break
+            entries = levels[level]
+            # Walk down from the largest amount the offer covers, oldest first within an amount
+            end = bisect_right(entries, (offer.amount, float("inf")))
+            while end > 0:
+                start = bisect_left(entries, (entries[end - 1][0],))
+                for i in range(start, end):
+                    request = self.requests[entries[i][2]]
+                    if request.risk_score >= offer.min_risk_score and request.borrower_id != offer.lender_id:
+                        return request
+                end = start
+        return None
+
+    # --- Matching ---
+    def submit_request(self, request: LoanRequest):
+        """
+        Matches a new request against the book. On a match the offer is
+        taken out of the book and (request, offer) returned; otherwise the
+        request rests in the book and None is returned.
+        """
+        offer = self.best_offer(request)
+        if offer is None:
+            self.add_request(request)
+            return None
+        self.cancel_offer(offer.id)
+        metrics.incr("loan_orders_matched_total", side="request")
+        return request, offer
+
+    def submit_offer(self, offer: LoanOffer):
+        """Offer-side version of submit_request(). Returns (request, offer) or None."""
+        request = self.best_request(offer)
+        if request is None:
+            self.add_offer(offer)
+            return None
+        self.cancel_request(request.id)
+        metrics.incr("loan_orders_matched_total", side="offer")
+        return request, offer
+
+
+def _remove(entries: list, key: tuple):
+    i = bisect_left(entries, key)
+    if i < len(entries) and entries[i] == key:
+        del entries[i]
+
+
+# --- Loading From Supabase ---
+def load_order_book(client):
+    """
+    Builds an OrderBook from the open rows of loan_requests and loan_offers.
+    Offers accept any score unless OFFER_MIN_SCORE_COLUMN is set.
+    """
+    book = OrderBook()
+
+    requests = list(iter_rows(client, REQUESTS_TABLE, REQUEST_COLUMNS,
+                              where=lambda query: query.in_("status", sorted(OPEN_REQUEST_STATUSES))))
+    scores = load_risk_scores(client, list({row["borrower_id"] for row in requests}))
+    for row in requests:
+        book.add_request(LoanRequest(
+            row["id"], row["borrower_id"], row["amount"], row["repayment_duration_days"], scores.get(row["borrower_id"], 0),
+        ))
+
+    offer_columns = f"{OFFER_COLUMNS},{OFFER_MIN_SCORE_COLUMN}" if OFFER_MIN_SCORE_COLUMN else OFFER_COLUMNS
+    for row in iter_rows(client, OFFERS_TABLE, offer_columns, where=lambda query: query.in_("status", sorted(OPEN_OFFER_STATUSES))):
+        book.add_offer(LoanOffer(
+            row["id"], row["lender_id"], row["amount"], row["interest_rate"],
+            row["repayment_duration"], row.get(OFFER_MIN_SCORE_COLUMN) or 0,
+        ))
+
+    print(f"Loaded {len(book.requests)} open requests and {len(book.offers)} open offers.")
+    return book
@@ -0,0 +1,264 @@
+# metrics.py
+
+import os
+import json
+import atexit
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# --- Metrics Config ---
+# METRICS_SINK: "off" (default), "prometheus" (text endpoint on METRICS_PORT)
+# or "jsonl" (one JSON line per span / counter update in METRICS_PATH)
+METRICS_SINK = os.getenv("METRICS_SINK", "off")
+METRICS_PORT = int(os.getenv("METRICS_PORT", 9108))
+METRICS_PATH = os.getenv("METRICS_PATH", "scoring_metrics.jsonl")
+METRICS_PREFIX = "credchain_"
+
+# Histogram buckets (seconds) for stage timings
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_enabled = False
+_sinks = []
+
+
+class MetricsRegistry:
+    """
+    In-process aggregate of every counter and stage timing, keyed by
+    (name, sorted labels). Thread-safe.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.timings = {}  # key -> [count, total seconds, max seconds, bucket counts]
+
+    def add(self, name: str, labels: tuple, value: float):
+        with self._lock:
+            self.counters[(name, labels)] = self.counters.get((name, labels), 0) + value
+
+    def observe(self, name: str, labels: tuple, seconds: float):
+        with self._lock:
+            timing = self.timings.get((name, labels))
+            if timing is None:
+                timing = self.timings[(name, labels)] = [0, 0.0, 0.0, [0] * len(LATENCY_BUCKETS)]
+            timing[0] += 1
+            timing[1] += seconds
+            timing[2] = max(timing[2], seconds)
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    timing[3][i] += 1
+
+    def snapshot(self):
+        """Returns a JSON-friendly copy of every counter and timing."""
+        with self._lock:
+            return {
+                "counters": [{"name": name, "labels": dict(labels), "value": value} for (name, labels), value in self.counters.items()],
+                "timings": [
+                    {"name": name, "labels": dict(labels), "count": t[0], "total_s": t[1], "max_s": t[2]}
+                    for (name, labels), t in self.timings.items()
+                ],
+            }
+
+    def prometheus_text(self):
+        """Renders the registry in the Prometheus text exposition format."""
+        def fmt_labels(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{key}="{value}"' for key, value in pairs) + "}"
+
+        lines = []
+        with self._lock:
+            for metric in sorted({name for name, _ in self.counters}):
+                lines.append(f"# TYPE {METRICS_PREFIX}{metric} counter")
+                for (name, labels), value in sorted(self.counters.items()):
+                    if name == metric:
+                        lines.append(f"{METRICS_PREFIX}{name}{fmt_labels(labels)} {value}")
+
+            for metric in sorted({name for name, _ in self.timings}):
+                lines.append(f"# TYPE {METRICS_PREFIX}{metric}_seconds histogram")
+                for (name, labels), (count, total, _, buckets) in sorted(self.timings.items()):
+                    if name != metric:
+                        continue
+                    for bound, bucket_count in zip(LATENCY_BUCKETS, buckets):
+                        lines.append(f"{METRICS_PREFIX}{name}_seconds_bucket{fmt_labels(labels, [('le', bound)])} {bucket_count}")
+                    lines.append(f"{METRICS_PREFIX}{name}_seconds_bucket{fmt_labels(labels, [('le', '+Inf')])} {count}")
+                    lines.append(f"{METRICS_PREFIX}{name}_seconds_sum{fmt_labels(labels)} {total}")
+                    lines.append(f"{METRICS_PREFIX}{name}_seconds_count{fmt_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+# --- Sinks ---
+class PrometheusSink:
+    """
+    Serves the registry at http://<host>:<port>/metrics for Prometheus to scrape.
+
+    Args:
+        port (int): Port to listen on.
+        host (str): Bind address.
+    """
+    def __init__(self, port: int = METRICS_PORT, host: str = "0.0.0.0"):
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                body = registry.prometheus_text().encode()
+                self.send_response(200 if self.path.startswith("/metrics") else 404)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        threading.Thread(target=self.httpd.serve_forever, name="metrics-http", daemon=True).start()
+
+    def on_span(self, name, labels, seconds):
+        pass
+
+    def on_counter(self, name, labels, value):
+        pass
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class JsonLinesSink:
+    """
+    Appends one JSON object per finished span and counter update to a file,
+    for offline analysis of where a slow run spent its time.
+
+    Args:
+        path (str): File to append to.
+    """
+    def __init__(self, path: str = METRICS_PATH):
+        self._lock = threading.Lock()
+        self._file = open(path, "a", buffering=1)
+
+    def _write(self, record: dict):
+        line = json.dumps(record)
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def on_span(self, name, labels, seconds):
+        self._write({"ts": time.time(), "type": "span", "name": name, "labels": dict(labels), "seconds": seconds})
+
+    def on_counter(self, name, labels, value):
+        self._write({"ts": time.time(), "type": "counter", "name": name, "labels": dict(labels), "value": value})
+
+    def close(self):
+        self._write({"ts": time.time(), "type": "snapshot", **registry.snapshot()})
+        with self._lock:
+            self._file.close()
+
+
+# --- Recording API ---
+def _label_key(labels: dict):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+class _Span:
+    __slots__ = ("name", "labels", "started")
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.started
+        labels = self.labels if exc_type is None else self.labels + (("outcome", "error"),)
+        registry.observe(self.name, labels, seconds)
+        for sink in _sinks:
+            sink.on_span(self.name, labels, seconds)
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def span(name: str, **labels):
+    """
+    Times a stage: `with metrics.span("etherscan_call", action="txlist"): ...`
+    Works across awaits. Returns a shared no-op object when metrics are off.
+    """
+    if not _enabled:
+        return _NOOP_SPAN
+    return _Span(name, _label_key(labels))
+
+
+def incr(name: str, value: float = 1, **labels):
+    """Adds `value` to a counter. Returns immediately when metrics are off."""
+    if not _enabled:
+        return
+    key = _label_key(labels)
+    registry.add(name, key, value)
+    for sink in _sinks:
+        sink.on_counter(name, key, value)
+
+
+def enable(sink=None):
+    """Turns recording on, optionally attaching a sink (PrometheusSink, JsonLinesSink, ...)."""
+    global _enabled
+    if sink is not None:
+        _sinks.append(sink)
+    _enabled = True
+
+
+def disable():
+    """Turns recording off and closes every attached sink."""
+    global _enabled
+    _enabled = False
+    while _sinks:
+        _sinks.pop().close()
+
+
+def is_enabled():
+    return _enabled
+
+
+def configure(sink_name: str = METRICS_SINK, port: int = METRICS_PORT):
+    """
+    Enables metrics from a config string: "off", "prometheus" or "jsonl".
+    Called from each entry point's __main__ (never at import), so a process
+    that only imports these modules opens no port.
+
+    Args:
+        sink_name (str): Which sink to attach.
+        port (int): Prometheus port; give each process on a host its own. If
+            it is already taken, metrics stay off with a warning.
+    """
+    sink_name = (sink_name or "off").lower()
+    if sink_name == "off" or _enabled:
+        return
+    if sink_name == "prometheus":
+        try:
+            sink = PrometheusSink(port)
+        except OSError as e:
+            print(f"WARNING: Could not serve metrics on port {port}; metrics are off. Error: {e}")
+            return
+        enable(sink)
+    elif sink_name == "jsonl":
+        enable(JsonLinesSink(METRICS_PATH))
+    else:
+        raise Exception(f"Unknown metrics sink '{sink_name}'. Use off, prometheus or jsonl.")
+    # Flush sinks (e.g. the final JSON lines snapshot) when the process exits
+    atexit.register(disable)
@@ -0,0 +1,132 @@
+# platform_history.py
+
+import os
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+from feature_cache import MemoryFeatureCache
+from supabase_queries import ID_CHUNK_SIZE, iter_rows
+
+# --- Loans Table Config ---
+# Lookups filter on borrower_id; the table should have an index on it:
+#   CREATE INDEX IF NOT EXISTS loans_borrower_id_idx ON loans (borrower_id);
+LOANS_TABLE = "loans"
+BORROWER_COLUMN = "borrower_id"
+LOAN_COLUMNS = "id,borrower_id,status,due_date"
+
+# Loans in these states count as repaid / defaulted. An 'active' loan whose
+# due date has passed also counts as defaulted.
+GOOD_STATUSES = {"repaid", "closed"}
+DEFAULTED_STATUSES = {"defaulted"}
+ACTIVE_STATUS = "active"
+
+# Short-lived cache so a batch prefetch is reused by later per-wallet lookups
+REPAYMENT_HISTORY_TTL = float(os.getenv("REPAYMENT_HISTORY_TTL", 600))
+_history_cache = MemoryFeatureCache(ttls={"repayment_history": REPAYMENT_HISTORY_TTL})
+
+_client = None
+_warned_no_client = False
+
+
+def set_client(client):
+    """Shares an existing Supabase client (e.g. the one update_scores built)."""
+    global _client
+    _client = client
+
+
+def _get_client():
+    """Returns the Supabase client, creating it from .env on first use (or None)."""
+    global _client, _warned_no_client
+    if _client is None:
+        load_dotenv()
+        url = os.environ.get("SUPABASE_URL")
+        key = os.environ.get("SUPABASE_SERVICE_KEY")
+        if not url or not key:
+            if not _warned_no_client:
+                print("WARNING: SUPABASE_URL / SUPABASE_SERVICE_KEY not set; platform repayment history will be empty.")
+                _warned_no_client = True
+            return None
+        from supabase import create_client
+        _client = create_client(url, key)
+    return _client
+
+
+def classify_loan(status: str, due_date: str, now: datetime):
+    """Returns 'good', 'defaulted' or None for one loan row."""
+    if status in GOOD_STATUSES:
+        return "good"
+    if status in DEFAULTED_STATUSES:
+        return "defaulted"
+    if status == ACTIVE_STATUS and due_date:
+        due = datetime.fromisoformat(due_date)
+        if due.tzinfo is None:
+            due = due.replace(tzinfo=timezone.utc)
+        if due < now:
+            return "defaulted"
+    return None
+
+
+def get_repayment_histories(borrower_ids):
+    """
+    Counts good and defaulted loans for a whole batch of borrowers.
+
+    Cached borrowers are served from memory; the rest are looked up with one
+    query per ID_CHUNK_SIZE IDs, so a batch run costs a handful of
+    queries instead of one per user. IDs are matched case-insensitively.
+
+    Args:
+        borrower_ids (iterable): Borrower IDs (wallet addresses).
+
+    Returns:
+        (dict): {borrower_id: (good_loans, defaulted_loans)} for every ID given.
+    """
+    results = {}
+    missing = []
+    for borrower_id in dict.fromkeys(borrower_ids):
+        cached = _history_cache.get(borrower_id.lower(), "repayment_history")
+        if cached is None:
+            missing.append(borrower_id)
+        else:
+            results[borrower_id] = tuple(cached)
+
+    if not missing:
+        return results
+
+    client = _get_client()
+    counts = {borrower_id.lower(): [0, 0] for borrower_id in missing}
+
+    if client is not None:
+        now = datetime.now(timezone.utc)
+        for start in range(0, len(missing), ID_CHUNK_SIZE):
+            chunk = missing[start:start + ID_CHUNK_SIZE]
+            # Match both the given and the lower-case spelling of each address
+            query_ids = list(dict.fromkeys(x for borrower_id in chunk for x in (borrower_id, borrower_id.lower())))
+            rows = iter_rows(client, LOANS_TABLE, LOAN_COLUMNS, where=lambda query: query.in_(BORROWER_COLUMN, query_ids))
+            for row in rows:
+                outcome = classify_loan(row.get("status"), row.get("due_date"), now)
+                key = (row.get(BORROWER_COLUMN) or "").lower()
+                if outcome is None or key not in counts:
+                    continue
+                counts[key][0 if outcome == "good" else 1] += 1
+
+    for borrower_id in missing:
+        good_loans, defaulted_loans = counts[borrower_id.lower()]
+        _history_cache.set(borrower_id.lower(), "repayment_history", [good_loans, defaulted_loans])
+        results[borrower_id] = (good_loans, defaulted_loans)
+
+    return results
+
+
+def invalidate_repayment_histories(borrower_ids):
+    """Forgets cached counts, e.g. after a borrower's loans changed."""
+    for borrower_id in borrower_ids:
+        _history_cache.invalidate(borrower_id.lower(), ["repayment_history"])
+
+
+def get_repayment_history(borrower_id: str):
+    """
+    Single-borrower version of get_repayment_histories().
+
+    Returns:
+        (tuple): (good_loans, defaulted_loans)
+    """
+    return get_repayment_histories([borrower_id])[borrower_id]
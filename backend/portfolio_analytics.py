@@ -0,0 +1,296 @@
+# portfolio_analytics.py
+
+import os
+import json
+import time
+import argparse
+from array import array
+from datetime import datetime, timezone
+import numpy as np
+import platform_history
+from scoring_kernel import LOW_RISK_ABOVE, MEDIUM_RISK_ABOVE
+from supabase_queries import iter_rows, load_risk_scores
+
+# --- Snapshot Config ---
+# A snapshot is a folder with one .npy file per column plus meta.json; the
+# columns are memory-mapped on load, so a report over millions of loans only
+# touches the pages it reads.
+SNAPSHOT_DIR = os.getenv("PORTFOLIO_SNAPSHOT_DIR", "portfolio_snapshot")
+LOAN_SNAPSHOT_COLUMNS = "id,lender_id,borrower_id,principal_amount,interest_rate,total_repayment_amount,start_date,due_date,status"
+
+# Borrower risk tiers, the same buckets as scoring's risk levels; borrowers
+# without a score land in "unscored"
+RISK_TIERS = ("high", "medium", "low", "unscored")
+UNSCORED = -1
+
+# Column name -> dtype
+COLUMN_DTYPES = {
+    "principal": np.float64,
+    "interest_rate": np.float64,
+    "total_repayment": np.float64,
+    "start_ts": np.int64,      # Unix seconds
+    "due_ts": np.int64,        # Unix seconds (0 if missing)
+    "status": np.int16,        # Index into meta["statuses"]
+    "lender": np.int32,        # Index into meta["lender_ids"]
+    "borrower": np.int32,      # Index into meta["borrower_ids"]
+    "borrower_score": np.int16,  # Borrower's risk score when snapshotted, or UNSCORED
+}
+
+
+class LoanColumns:
+    """
+    The loans table as parallel NumPy arrays (one element per loan) plus
+    the vocabularies the integer columns index into.
+
+    Attributes:
+        columns (dict): Column name -> array, see COLUMN_DTYPES.
+        lender_ids / borrower_ids (list): Wallet ID per lender / borrower index.
+        statuses (list): Status name per status code.
+        snapshot_at (float): Unix time the data was read from the database.
+    """
+    def __init__(self, columns: dict, lender_ids: list, borrower_ids: list, statuses: list, snapshot_at: float = None):
+        self.columns = columns
+        self.lender_ids = lender_ids
+        self.borrower_ids = borrower_ids
+        self.statuses = statuses
+        self.snapshot_at = snapshot_at or time.time()
+
+    def __len__(self):
+        return len(self.columns["principal"])
+
+    def __getattr__(self, name):
+        columns = self.__dict__.get("columns")
+        if columns is not None and name in columns:
+            return columns[name]
+        raise AttributeError(name)
+
+    def status_mask(self, names):
+        """Boolean mask of the loans whose status is in `names`."""
+        codes = [code for code, status in enumerate(self.statuses) if status in names]
+        return np.isin(self.columns["status"], codes)
+
+    # --- Snapshots ---
+    def save(self, directory: str = SNAPSHOT_DIR):
+        """Writes the columns as .npy files plus meta.json (atomically replacing meta.json last)."""
+        os.makedirs(directory, exist_ok=True)
+        for name, values in self.columns.items():
+            np.save(os.path.join(directory, f"{name}.npy"), np.ascontiguousarray(values, dtype=COLUMN_DTYPES[name]))
+        meta = {
+            "rows": len(self),
+            "snapshot_at": self.snapshot_at,
+            "lender_ids": self.lender_ids,
+            "borrower_ids": self.borrower_ids,
+            "statuses": self.statuses,
+        }
+        tmp_path = os.path.join(directory, "meta.json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, os.path.join(directory, "meta.json"))
+
+    @classmethod
+    def load(cls, directory: str = SNAPSHOT_DIR, mmap: bool = True):
+        """Opens a snapshot; with mmap the columns are read lazily from disk."""
+        with open(os.path.join(directory, "meta.json")) as f:
+            meta = json.load(f)
+        columns = {
+            name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r" if mmap else None)
+            for name in COLUMN_DTYPES
+        }
+        return cls(columns, meta["lender_ids"], meta["borrower_ids"], meta["statuses"], meta["snapshot_at"])
+
+
+def _timestamp(value):
+    """ISO-8601 string -> Unix seconds (0 for missing values)."""
+    if not value:
+        return 0
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+
+def build_loan_columns(rows, risk_scores: dict = None):
+    """
+    Converts loan rows (dicts shaped like the loans table) into LoanColumns.
+    Rows are consumed one at a time into compact typed buffers, so the full
+    list of dicts never has to exist in memory.
+
+    Args:
+        rows (iterable): Loan rows.
+        risk_scores (dict): Borrower ID -> risk score, for the risk tiers.
+    """
+    risk_scores = risk_scores or {}
+    buffers = {name: array("d" if np.dtype(dtype).kind == "f" else "q") for name, dtype in COLUMN_DTYPES.items()}
+    lenders, borrowers, statuses = {}, {}, {}
+
+    for row in rows:
+        borrower_id = row.get("borrower_id") or ""
+        score = risk_scores.get(borrower_id)
+        buffers["principal"].append(float(row.get("principal_amount") or 0))
+        buffers["interest_rate"].append(float(row.get("interest_rate") or 0))
+        buffers["total_repayment"].append(float(row.get("total_repayment_amount") or 0))
+        buffers["start_ts"].append(_timestamp(row.get("start_date")))
+        buffers["due_ts"].append(_timestamp(row.get("due_date")))
+        buffers["status"].append(statuses.setdefault(row.get("status") or "", len(statuses)))
+        buffers["lender"].append(lenders.setdefault(row.get("lender_id") or "", len(lenders)))
+        buffers["borrower"].append(borrowers.setdefault(borrower_id, len(borrowers)))
+        buffers["borrower_score"].append(UNSCORED if score is None else int(score))
+
+    columns = {name: np.frombuffer(buffer, dtype=buffer.typecode).astype(COLUMN_DTYPES[name]) for name, buffer in buffers.items()}
+    return LoanColumns(columns, list(lenders), list(borrowers), list(statuses))
+
+
+# --- Loading From Supabase ---
+def snapshot_from_supabase(client, directory: str = SNAPSHOT_DIR):
+    """Reads the loans table (and borrower scores) and writes a columnar snapshot."""
+    columns = build_loan_columns(iter_rows(client, platform_history.LOANS_TABLE, LOAN_SNAPSHOT_COLUMNS))
+    scores = load_risk_scores(client, columns.borrower_ids)
+    score_by_index = np.array([scores.get(borrower_id, UNSCORED) for borrower_id in columns.borrower_ids], dtype=np.int16)
+    if len(columns):
+        columns.columns["borrower_score"] = score_by_index[columns.borrower]
+    columns.save(directory)
+    print(f"Saved {len(columns)} loans ({len(columns.lender_ids)} lenders, {len(columns.borrower_ids)} borrowers) to {directory}.")
+    return columns
+
+
+# --- Vectorized Analytics ---
+def loan_outcomes(loans: LoanColumns, now: float = None):
+    """
+    Classifies every loan like platform_history.classify_loan(), in one pass.
+
+    Returns:
+        (tuple): Boolean masks (active, overdue, good, defaulted). Overdue
+                 active loans are both `overdue` and `defaulted`.
+    """
+    now = time.time() if now is None else now
+    active = loans.status_mask({platform_history.ACTIVE_STATUS})
+    overdue = active & (loans.due_ts > 0) & (loans.due_ts < now)
+    good = loans.status_mask(platform_history.GOOD_STATUSES)
+    defaulted = loans.status_mask(platform_history.DEFAULTED_STATUSES) | overdue
+    return active, overdue, good, defaulted
+
+
+def risk_tiers(scores: np.ndarray):
+    """Maps risk scores to indexes into RISK_TIERS."""
+    scores = np.asarray(scores)
+    tiers = (scores > MEDIUM_RISK_ABOVE).astype(np.int8) + (scores > LOW_RISK_ABOVE)
+    return np.where(scores == UNSCORED, RISK_TIERS.index("unscored"), tiers)
+
+
+def default_rates_by_tier(loans: LoanColumns, now: float = None):
+    """
+    Default rate per borrower risk tier, over resolved loans (good + defaulted).
+
+    Returns:
+        (dict): tier -> {"loans", "defaulted", "default_rate"}
+    """
+    _, _, good, defaulted = loan_outcomes(loans, now)
+    tiers = risk_tiers(loans.borrower_score)
+    resolved_counts = np.bincount(tiers, weights=good | defaulted, minlength=len(RISK_TIERS))
+    defaulted_counts = np.bincount(tiers, weights=defaulted, minlength=len(RISK_TIERS))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rates = np.where(resolved_counts > 0, defaulted_counts / resolved_counts, 0.0)
+    return {
+        tier: {"loans": int(resolved_counts[i]), "defaulted": int(defaulted_counts[i]), "default_rate": float(rates[i])}
+        for i, tier in enumerate(RISK_TIERS)
+    }
+
+
+def exposure(loans: LoanColumns, side: str = "lender", now: float = None, tier_default_rates: dict = None):
+    """
+    Per-lender or per-borrower totals over active loans, each one np.bincount.
+
+    Expected yield is the interest still due, with each loan's repayment
+    discounted by its borrower tier's historical default rate.
+
+    Args:
+        side (str): "lender" or "borrower".
+        tier_default_rates (dict): Output of default_rates_by_tier() (computed if omitted).
+
+    Returns:
+        (dict): "ids" plus arrays aligned with it: active_loans, principal,
+                outstanding, overdue, expected_interest, expected_yield,
+                weighted_rate.
+    """
+    if side not in ("lender", "borrower"):
+        raise Exception(f"Unknown exposure side '{side}'. Use lender or borrower.")
+    index = loans.lender if side == "lender" else loans.borrower
+    ids = loans.lender_ids if side == "lender" else loans.borrower_ids
+    size = len(ids)
+
+    active, overdue, _, _ = loan_outcomes(loans, now)
+    tier_default_rates = tier_default_rates or default_rates_by_tier(loans, now)
+    tier_pd = np.array([tier_default_rates[tier]["default_rate"] for tier in RISK_TIERS])
+
+    principal = np.where(active, loans.principal, 0.0)
+    outstanding = np.where(active, loans.total_repayment, 0.0)
+    expected_repayment = outstanding * (1.0 - tier_pd[risk_tiers(loans.borrower_score)])
+
+    totals = {
+        "active_loans": np.bincount(index, weights=active, minlength=size).astype(np.int64),
+        "principal": np.bincount(index, weights=principal, minlength=size),
+        "outstanding": np.bincount(index, weights=outstanding, minlength=size),
+        "overdue": np.bincount(index, weights=np.where(overdue, loans.total_repayment, 0.0), minlength=size),
+        "expected_interest": np.bincount(index, weights=outstanding - principal, minlength=size),
+        "expected_yield": np.bincount(index, weights=expected_repayment - principal, minlength=size),
+    }
+    rate_sum = np.bincount(index, weights=principal * loans.interest_rate, minlength=size)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        totals["weighted_rate"] = np.where(totals["principal"] > 0, rate_sum / totals["principal"], 0.0)
+    totals["ids"] = ids
+    return totals
+
+
+def _top(totals: dict, key: str, count: int):
+    order = np.argsort(-totals[key], kind="stable")[:count]
+    return [
+        {"id": totals["ids"][i], **{name: values[i].item() for name, values in totals.items() if name != "ids"}}
+        for i in order if totals[key][i] > 0
+    ]
+
+
+def portfolio_report(loans: LoanColumns, now: float = None, top: int = 10):
+    """
+    Builds the whole dashboard report: platform totals, default rates by
+    risk tier, and the largest lender and borrower exposures.
+    """
+    now = time.time() if now is None else now
+    active, overdue, good, defaulted = loan_outcomes(loans, now)
+    tier_rates = default_rates_by_tier(loans, now)
+    lenders = exposure(loans, "lender", now, tier_rates)
+    borrowers = exposure(loans, "borrower", now, tier_rates)
+
+    return {
+        "loans": len(loans),
+        "active_loans": int(active.sum()),
+        "overdue_loans": int(overdue.sum()),
+        "principal_outstanding": float(lenders["principal"].sum()),
+        "amount_outstanding": float(lenders["outstanding"].sum()),
+        "amount_overdue": float(lenders["overdue"].sum()),
+        "expected_interest": float(lenders["expected_interest"].sum()),
+        "expected_yield": float(lenders["expected_yield"].sum()),
+        "repaid_loans": int(good.sum()),
+        "defaulted_loans": int(defaulted.sum()),
+        "default_rates_by_tier": tier_rates,
+        "top_lenders": _top(lenders, "outstanding", top),
+        "top_borrowers": _top(borrowers, "outstanding", top),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Columnar portfolio analytics over the loans table.")
+    parser.add_argument("command", choices=("snapshot", "report"), help="snapshot: read Supabase into a local snapshot; report: analyse a snapshot.")
+    parser.add_argument("--dir", default=SNAPSHOT_DIR, help="Snapshot folder.")
+    parser.add_argument("--top", type=int, default=10, help="Lenders / borrowers listed in the report.")
+    args = parser.parse_args()
+
+    if args.command == "snapshot":
+        from update_scores import connect_supabase
+        client = connect_supabase()
+        if client is not None:
+            snapshot_from_supabase(client, args.dir)
+    else:
+        started = time.perf_counter()
+        report = portfolio_report(LoanColumns.load(args.dir), top=args.top)
+        print(json.dumps(report, indent=2))
+        print(f"Report over {report['loans']} loans took {time.perf_counter() - started:.2f}s.")
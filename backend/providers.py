@@ -0,0 +1,251 @@
+# providers.py
+
+import os
+import time
+import random
+import asyncio
+import threading
+import metrics
+
+# --- Retry / Circuit Breaker Config ---
+PROVIDER_MAX_RETRIES = int(os.getenv("PROVIDER_MAX_RETRIES", 5))
+PROVIDER_BACKOFF_BASE = float(os.getenv("PROVIDER_BACKOFF_BASE", 0.5))
+PROVIDER_BACKOFF_MAX = float(os.getenv("PROVIDER_BACKOFF_MAX", 10))
+# How long the whole provider is held back after a rate-limit response
+PROVIDER_RATE_LIMIT_PAUSE = float(os.getenv("PROVIDER_RATE_LIMIT_PAUSE", 1.0))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", 10))
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", 30))
+
+# Phrases providers use when throttling (Etherscan, Infura, Alchemy, ...)
+RATE_LIMIT_HINTS = ("rate limit", "too many requests", "limit exceeded", "max calls per sec")
+
+# JSON-RPC error codes (JSON-RPC 2.0 / EIP-1474). -32603 and the -32000..-32099
+# server range are retried, except the codes in RPC_REJECTED_CODES: parse
+# error, invalid request, method not found, invalid params, resource not
+# found, transaction rejected, method not supported, version not supported.
+RPC_RATE_LIMIT_CODE = -32005
+RPC_REJECTED_CODES = {-32700, -32600, -32601, -32602, -32001, -32003, -32004, -32006}
+
+
+class ProviderError(Exception):
+    """The provider answered with an error that retrying will not fix (bad key, bad params, ...)."""
+
+
+class RetryableProviderError(ProviderError):
+    """A transient failure: timeout, dropped connection, HTTP 5xx, garbled body."""
+
+
+class RateLimitedError(RetryableProviderError):
+    """The provider asked us to slow down (HTTP 429, "Max rate limit reached", ...)."""
+
+
+class CircuitOpenError(ProviderError):
+    """The provider has been failing; calls are shed until the breaker resets."""
+
+
+def classify_error(exc: Exception):
+    """
+    Maps a raw client exception (aiohttp, web3, JSON decoding, ...) onto the
+    provider error types, so the retry loop knows what to do with it.
+    """
+    if isinstance(exc, ProviderError):
+        return exc
+
+    message = str(exc)
+    lowered = message.lower()
+    status = getattr(exc, "status", None)
+    if (status == 429 or type(exc).__name__ == "TooManyRequests"
+            or any(hint in lowered for hint in RATE_LIMIT_HINTS)):
+        return RateLimitedError(message)
+    if status is not None and 400 <= status < 500:
+        return ProviderError(message)
+    if type(exc).__name__.endswith("RPCError"):
+        # The node understood the call and rejected it (bad params, ...)
+        return ProviderError(message)
+    # Timeouts, connection resets, 5xx, non-JSON error pages
+    return RetryableProviderError(f"{type(exc).__name__}: {message}")
+
+
+def raise_for_http_status(status: int, request: str):
+    """
+    Raises the provider error for an HTTP error status: 429 is a rate limit,
+    5xx is transient, any other 4xx (bad key, forbidden, ...) is final.
+
+    Args:
+        status (int): HTTP status code.
+        request (str): What was asked for, for the message (e.g. "RPC eth_getBalance").
+    """
+    if status == 429:
+        raise RateLimitedError(f"{request}: HTTP 429")
+    if status >= 500:
+        raise RetryableProviderError(f"{request}: HTTP {status}")
+    if status >= 400:
+        raise ProviderError(f"{request}: HTTP {status}")
+
+
+def classify_rpc_error(error):
+    """
+    Maps a JSON-RPC error object ({"code": ..., "message": ...}) onto the
+    provider error types by its code: throttling is a rate limit, only
+    server-side errors are retried, and anything else means the node
+    understood the call and rejected it.
+    """
+    if not isinstance(error, dict):
+        # Not a JSON-RPC error object at all: a garbled reply
+        return RetryableProviderError(f"Malformed JSON-RPC error: {error}")
+
+    code = error.get("code")
+    message = f"RPC error {code}: {error.get('message')}"
+    if code == RPC_RATE_LIMIT_CODE or any(hint in message.lower() for hint in RATE_LIMIT_HINTS):
+        return RateLimitedError(message)
+    if isinstance(code, int) and code not in RPC_REJECTED_CODES and (code == -32603 or -32099 <= code <= -32000):
+        return RetryableProviderError(message)
+    return ProviderError(message)
+
+
+def is_provider_outage(exc: Exception):
+    """
+    Returns True if `exc` (or an error it was raised from) means the provider
+    itself is down or throttling us, as opposed to a problem with one request.
+    Work that failed this way should be retried later, not written off.
+    """
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        if isinstance(exc, (RetryableProviderError, CircuitOpenError)):
+            return True
+        seen.add(id(exc))
+        exc = exc.__cause__ or exc.__context__
+    return False
+
+
+class CircuitBreaker:
+    """
+    Trips after `failure_threshold` consecutive hard failures and rejects
+    calls for `reset_seconds`; then lets a single trial call through
+    (half-open) and closes again if it succeeds.
+
+    Rate-limit responses do not count as failures: a throttled provider is
+    healthy, it just needs to be called more slowly.
+
+    Args:
+        failure_threshold (int): Consecutive failures that open the circuit.
+        reset_seconds (float): How long the circuit stays open.
+    """
+    def __init__(self, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD, reset_seconds: float = CIRCUIT_RESET_SECONDS):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Returns True if a call may go out now."""
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_seconds:
+                self.state = "half_open"
+                self._trial_in_flight = False
+            if self.state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self.state = "closed"
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        """Returns True if this failure just opened the circuit."""
+        with self._lock:
+            self._failures += 1
+            if self.state == "half_open" or self._failures >= self.failure_threshold:
+                opened = self.state != "open"
+                self.state = "open"
+                self._opened_at = time.monotonic()
+                self._trial_in_flight = False
+                return opened
+            return False
+
+
+class ProviderClient:
+    """
+    Wraps every call to one upstream provider with its shared rate limiter,
+    jittered exponential backoff, rate-limit handling and a circuit breaker.
+
+    Args:
+        name (str): Provider name used in errors and metrics ("etherscan", "rpc").
+        limiter (RateLimiter): Token bucket shared by all callers of this provider.
+        max_retries (int): Retries after the first attempt.
+        backoff_base (float): First backoff ceiling, in seconds; doubles per retry.
+        backoff_max (float): Largest backoff ceiling, in seconds.
+        rate_limit_pause (float): Seconds the whole provider is held back after a 429.
+        breaker (CircuitBreaker): Defaults to a new breaker with the module config.
+    """
+    def __init__(self, name: str, limiter, max_retries: int = PROVIDER_MAX_RETRIES,
+                 backoff_base: float = PROVIDER_BACKOFF_BASE, backoff_max: float = PROVIDER_BACKOFF_MAX,
+                 rate_limit_pause: float = PROVIDER_RATE_LIMIT_PAUSE, breaker: CircuitBreaker = None):
+        self.name = name
+        self.limiter = limiter
+        self.max_retries = max(0, max_retries)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.rate_limit_pause = rate_limit_pause
+        self.breaker = breaker or CircuitBreaker()
+
+    def backoff_delay(self, attempt: int):
+        """Full-jitter exponential backoff: uniform in [0, min(max, base * 2^attempt)]."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    async def call(self, fn, *args, action: str = None):
+        """
+        Awaits fn(*args) under this provider's policies and returns its result.
+
+        Raises:
+            CircuitOpenError: The provider is being shed.
+            ProviderError: A non-retryable error, or retries were exhausted.
+        """
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                metrics.incr("upstream_shed_total", provider=self.name, action=action)
+                raise CircuitOpenError(f"{self.name} circuit is open after repeated failures; shedding calls.")
+
+            await self.limiter.acquire_async()
+            metrics.incr("upstream_calls_total", provider=self.name, action=action)
+            try:
+                with metrics.span("upstream_call", provider=self.name, action=action):
+                    result = await fn(*args)
+                self.breaker.record_success()
+                return result
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                error = classify_error(e)
+                metrics.incr("upstream_errors_total", provider=self.name, action=action, kind=type(error).__name__)
+
+                if isinstance(error, RateLimitedError):
+                    # Throttled, not broken: slow everyone down, keep the breaker closed
+                    self.limiter.pause(self.rate_limit_pause)
+                    self.breaker.record_success()
+                elif isinstance(error, RetryableProviderError):
+                    if self.breaker.record_failure():
+                        metrics.incr("circuit_opened_total", provider=self.name)
+                        print(f"WARNING: {self.name} circuit opened after repeated failures.")
+                else:
+                    # The provider answered (it just rejected this call), so it is up
+                    self.breaker.record_success()
+
+                if not isinstance(error, RetryableProviderError) or attempt >= self.max_retries:
+                    if error is e:
+                        raise
+                    raise error from e
+
+                metrics.incr("retries_total", provider=self.name, action=action)
+                await asyncio.sleep(self.backoff_delay(attempt))
+                attempt += 1
@@ -0,0 +1,67 @@
+# rate_limit.py
+
+import asyncio
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    A thread-safe token bucket shared by every worker that talks to the same
+    upstream provider (Etherscan, the RPC node, ...).
+
+    Callers reserve a slot with acquire(); if the bucket is empty the slot is
+    booked in the future and the caller sleeps until it comes up, so N workers
+    together never exceed `rate` calls per second.
+
+    Args:
+        rate (float): Sustained calls per second. 0 or less disables limiting.
+        burst (int): How many calls may go out back-to-back from a full bucket.
+    """
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = float(rate)
+        self.burst = max(1, int(burst))
+        self._tokens = float(self.burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self):
+        """Books one call and returns how long (in seconds) the caller must wait."""
+        if self.rate <= 0:
+            return 0.0
+
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            # Tokens may go negative: that is a reservation for a future slot
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def pause(self, seconds: float):
+        """
+        Holds back every caller for `seconds` (e.g. after the provider said
+        "rate limit reached"). Repeated pauses do not stack.
+        """
+        if self.rate <= 0:
+            return
+
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens = min(self._tokens, -seconds * self.rate)
+
+    def acquire(self):
+        """Blocks until the caller is allowed to make one call."""
+        delay = self._reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self):
+        """Same as acquire(), but yields to the event loop instead of blocking it."""
+        delay = self._reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
@@ -0,0 +1,292 @@
+# score_job.py
+
+import os
+import json
+import argparse
+import hashlib
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+import metrics
+import platform_history
+from providers import is_provider_outage
+from scoring_kernel import score_feature_records
+from supabase_queries import iter_pages
+from update_scores import (
+    TEST_MODE, MAX_WORKERS, WRITE_BATCH_SIZE, WRITE_FLUSH_SECONDS,
+    USER_TABLE, WALLET_COLUMN, SCORE_COLUMN, RISK_LEVEL_COLUMN, FEATURES_COLUMN,
+    connect_supabase, build_score_writer, score_wallets, print_cache_stats,
+)
+
+# --- Job Config ---
+USER_PAGE_SIZE = int(os.getenv("SCORE_JOB_PAGE_SIZE", 1000))
+CHECKPOINT_DIR = os.getenv("SCORE_JOB_CHECKPOINT_DIR", "score_job_checkpoints")
+# A page where at least this share of the shard's wallets fail is treated as
+# an outage (bad API key, database down, ...) rather than as bad wallets: the
+# job stops without checkpointing past it. Pages with fewer than
+# FAILURE_RATIO_MIN_WALLETS shard wallets are too small to judge this way.
+MAX_FAILURE_RATIO = float(os.getenv("SCORE_JOB_MAX_FAILURE_RATIO", 0.5))
+FAILURE_RATIO_MIN_WALLETS = 10
+
+
+def parse_shard(value: str):
+    """Parses '--shard i/N' into (i, N), with 0 <= i < N."""
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Shard must look like i/N, got '{value}'.")
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"Shard index must be in [0, {count}), got {index}.")
+    return index, count
+
+
+def in_shard(wallet_id: str, shard_index: int, shard_count: int):
+    """
+    Deterministically assigns a wallet to one of `shard_count` shards.
+    Uses a stable hash of the lower-cased address, so every process and host
+    agrees on the split without coordinating.
+    """
+    if shard_count == 1:
+        return True
+    digest = hashlib.sha1(wallet_id.lower().encode()).digest()
+    return int.from_bytes(digest[:8], "big") % shard_count == shard_index
+
+
+class ShardCheckpoint:
+    """
+    Progress of one shard, stored as a small JSON file.
+
+    `last_key` is the highest wallet ID whose page has been fully scored and
+    written; a resumed run continues with the next page after it.
+    `failed_ids` maps each wallet that failed on an earlier page to its error;
+    a resumed run retries them first.
+
+    Args:
+        directory (str): Folder holding the checkpoint files.
+        shard_index (int): This shard.
+        shard_count (int): Total number of shards.
+    """
+    def __init__(self, directory: str, shard_index: int, shard_count: int):
+        self.path = os.path.join(directory, f"shard-{shard_index}-of-{shard_count}.json")
+        self.state = {"last_key": None, "updated": 0, "failed_ids": {}, "started_at": None, "completed": False}
+
+    def load(self):
+        """Loads saved progress. Returns True if there is an unfinished run to resume."""
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path) as f:
+            self.state.update(json.load(f))
+        return not self.state["completed"]
+
+    def reset(self):
+        self.state = {
+            "last_key": None,
+            "updated": 0,
+            "failed_ids": {},
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "completed": False,
+        }
+        self.save()
+
+    def save(self):
+        """Writes the checkpoint atomically (a crash never leaves a half-written file)."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, self.path)
+
+
+def iter_user_rows(supabase, page_size: int, columns: str = WALLET_COLUMN, after_key: str = None):
+    """
+    Pages through the users table by keyset on wallet ID.
+
+    Yields:
+        (list): Rows with a wallet ID, in ascending wallet ID order.
+    """
+    for rows in iter_pages(supabase, USER_TABLE, columns, key=WALLET_COLUMN, after_key=after_key, page_size=page_size):
+        rows = [user for user in rows if user.get(WALLET_COLUMN)]
+        if rows:
+            yield rows
+
+
+def iter_user_pages(supabase, page_size: int, after_key: str = None):
+    """
+    Like iter_user_rows(), but yields just the wallet IDs of each page.
+
+    Yields:
+        (list): Wallet IDs, in ascending order.
+    """
+    for rows in iter_user_rows(supabase, page_size, after_key=after_key):
+        yield [row[WALLET_COLUMN] for row in rows]
+
+
+def score_batch(executor, writer, wallet_ids: list, max_failure_ratio: float = MAX_FAILURE_RATIO):
+    """
+    Scores a batch of wallets and waits until every row is written.
+
+    Returns:
+        (tuple): (rows written, {wallet_id: error message} for the wallets that failed)
+
+    Raises:
+        Exception: The failures point at an outage (provider down, throttled
+            or shedding calls, or at least `max_failure_ratio` of the batch
+            failing), so nothing about this batch should be checkpointed.
+    """
+    repayment_histories = platform_history.get_repayment_histories(wallet_ids)
+    written_before, write_failed_before = writer.written, len(writer.failed)
+
+    errors = {}
+    score_wallets(executor, writer, wallet_ids, repayment_histories, failures=errors)
+    writer.flush()
+
+    outages = [e for e in errors.values() if is_provider_outage(e)]
+    if outages:
+        raise Exception(f"{len(outages)} of {len(wallet_ids)} wallets failed on an upstream outage: {outages[0]}")
+
+    failed = {wallet_id: str(e) for wallet_id, e in errors.items()}
+    failed.update(writer.failed[write_failed_before:])
+    if (max_failure_ratio is not None and len(wallet_ids) >= FAILURE_RATIO_MIN_WALLETS
+            and len(failed) >= max_failure_ratio * len(wallet_ids)):
+        raise Exception(f"{len(failed)} of {len(wallet_ids)} wallets failed (stop threshold is {max_failure_ratio:.0%}).")
+    return writer.written - written_before, failed
+
+
+def run_score_job(shard_index: int = 0, shard_count: int = 1, max_workers: int = MAX_WORKERS,
+                  page_size: int = USER_PAGE_SIZE, checkpoint_dir: str = CHECKPOINT_DIR, restart: bool = False):
+    """
+    Scores one shard of the user base, page by page, checkpointing after each
+    page so a crashed or banned run can pick up where it stopped. A page that
+    fails on an upstream outage is not checkpointed: the job stops, and a
+    rerun starts again from that page.
+
+    Note: hash sharding cannot be expressed as a PostgREST filter, so every
+    shard pages through the whole users table (the wallet ID column only)
+    and keeps its own share; N shards read that column N times.
+
+    Args:
+        shard_index (int): Which shard this process handles.
+        shard_count (int): How many shards the wallet space is split into.
+        max_workers (int): Wallets scored in parallel.
+        page_size (int): Users read per keyset page (and per checkpoint).
+        checkpoint_dir (str): Where shard checkpoint files live.
+        restart (bool): Ignore any saved progress and start from the beginning.
+    """
+    print(f"Starting score job shard {shard_index}/{shard_count} (TEST_MODE = {TEST_MODE}, workers = {max_workers})...")
+
+    supabase = connect_supabase()
+    if supabase is None:
+        return
+    platform_history.set_client(supabase)
+
+    checkpoint = ShardCheckpoint(checkpoint_dir, shard_index, shard_count)
+    if not restart and checkpoint.load():
+        print(f"Resuming after '{checkpoint.state['last_key']}' "
+              f"({checkpoint.state['updated']} updated, {len(checkpoint.state['failed_ids'])} failed so far).")
+    else:
+        checkpoint.reset()
+    state = checkpoint.state
+
+    writer = build_score_writer(supabase, WRITE_BATCH_SIZE, WRITE_FLUSH_SECONDS)
+    with writer, ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        try:
+            # --- 1. Retry the wallets that failed on earlier pages ---
+            # (no failure-ratio stop here: these are the wallets that failed before)
+            retry_ids = list(state["failed_ids"])
+            for start in range(0, len(retry_ids), page_size):
+                chunk = retry_ids[start:start + page_size]
+                updated, failed = score_batch(executor, writer, chunk, max_failure_ratio=None)
+                for wallet_id in chunk:
+                    state["failed_ids"].pop(wallet_id, None)
+                state["failed_ids"].update(failed)
+                state["updated"] += updated
+                checkpoint.save()
+            if retry_ids:
+                print(f"RETRIED: {len(retry_ids) - len(state['failed_ids'])} of {len(retry_ids)} previously failed wallets now scored.")
+
+            # --- 2. Continue with the pages after the checkpoint ---
+            for page in iter_user_pages(supabase, page_size, state["last_key"]):
+                wallet_ids = [wallet_id for wallet_id in page if in_shard(wallet_id, shard_index, shard_count)]
+
+                if wallet_ids:
+                    updated, failed = score_batch(executor, writer, wallet_ids)
+                    state["updated"] += updated
+                    state["failed_ids"].update(failed)
+
+                # The whole page is scored and written: safe to move past it
+                state["last_key"] = page[-1]
+                checkpoint.save()
+                print(f"CHECKPOINT: shard {shard_index}/{shard_count} done through '{page[-1]}'.")
+
+        except Exception as e:
+            print(f"ERROR: Score job stopped early; rerun to resume from the last checkpoint. {e}")
+            return
+
+    state["completed"] = True
+    checkpoint.save()
+
+    print("\n--- Shard Complete ---")
+    print(f"Successfully updated: {state['updated']}")
+    print(f"Failed to update:     {len(state['failed_ids'])}")
+    print_cache_stats()
+    if state["failed_ids"]:
+        print(f"Failed wallet IDs are listed in {checkpoint.path}.")
+
+
+def rescore_from_features(page_size: int = USER_PAGE_SIZE, weights: dict = None):
+    """
+    Re-scores every user from the features saved with their last score (e.g.
+    after a WEIGHTS change), with no Etherscan or RPC calls: one vectorised
+    kernel pass per page. Users scored before features were saved are
+    skipped; the next online run covers them.
+
+    Args:
+        page_size (int): Users read (and scored) per keyset page.
+        weights (dict): Score weights; defaults to scoring_kernel.WEIGHTS.
+    """
+    print(f"Starting offline re-score from stored features (TEST_MODE = {TEST_MODE})...")
+
+    supabase = connect_supabase()
+    if supabase is None:
+        return
+
+    skipped = 0
+    writer = build_score_writer(supabase, WRITE_BATCH_SIZE, WRITE_FLUSH_SECONDS)
+    with writer:
+        try:
+            for rows in iter_user_rows(supabase, page_size, f"{WALLET_COLUMN},{FEATURES_COLUMN}"):
+                scored = [row for row in rows if row.get(FEATURES_COLUMN)]
+                skipped += len(rows) - len(scored)
+                if not scored:
+                    continue
+                scores, risk_levels = score_feature_records([row[FEATURES_COLUMN] for row in scored], weights)
+                now = datetime.now(timezone.utc).isoformat()
+                for row, score, risk_level in zip(scored, scores, risk_levels):
+                    writer.add({WALLET_COLUMN: row[WALLET_COLUMN], SCORE_COLUMN: int(score), RISK_LEVEL_COLUMN: str(risk_level), "last_updated": now})
+        except Exception as e:
+            print(f"ERROR: Offline re-score stopped early. {e}")
+
+    print("\n--- Offline Re-Score Complete ---")
+    print(f"Successfully updated: {writer.written}")
+    print(f"Failed to update:     {len(writer.failed)}")
+    print(f"Skipped (no features): {skipped}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Resumable, sharded batch risk-score update.")
+    parser.add_argument("--shard", type=parse_shard, default=(0, 1), help="This worker's shard as i/N (default 0/1).")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS, help="Wallets scored in parallel.")
+    parser.add_argument("--page-size", type=int, default=USER_PAGE_SIZE, help="Users per keyset page / checkpoint.")
+    parser.add_argument("--checkpoint-dir", default=CHECKPOINT_DIR, help="Folder for shard checkpoint files.")
+    parser.add_argument("--restart", action="store_true", help="Ignore saved progress and start over.")
+    parser.add_argument("--from-stored-features", action="store_true",
+                        help="Re-score everyone from the features saved with their last score, with no network calls.")
+    parser.add_argument("--metrics-port", type=int,
+                        help="Prometheus port for this process (default METRICS_PORT + shard index, so shards on one host don't collide).")
+    args = parser.parse_args()
+
+    metrics.configure(port=args.metrics_port if args.metrics_port is not None else metrics.METRICS_PORT + args.shard[0])
+
+    if args.from_stored_features:
+        rescore_from_features(args.page_size)
+    else:
+        run_score_job(args.shard[0], args.shard[1], args.workers, args.page_size, args.checkpoint_dir, args.restart)
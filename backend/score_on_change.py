@@ -0,0 +1,464 @@
+# score_on_change.py
+
+import os
+import time
+import sqlite3
+import argparse
+import threading
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+import metrics
+import platform_history
+import scoring_logic
+from supabase_queries import iter_rows
+from score_job import iter_user_pages, USER_PAGE_SIZE
+from update_scores import (
+    TEST_MODE, MAX_WORKERS, WRITE_BATCH_SIZE, WRITE_FLUSH_SECONDS,
+    connect_supabase, build_score_writer, score_wallets,
+)
+
+# --- Score-On-Change Config ---
+# Instead of rescoring every user on every run, the watcher keeps a dirty set
+# of wallets with new on-chain or platform activity and rescores only those.
+CHANGE_STORE_PATH = os.getenv("SCORE_CHANGE_STORE_PATH", "score_on_change.sqlite3")
+POLL_INTERVAL_SECONDS = float(os.getenv("SCORE_POLL_INTERVAL", 15))
+# Fallback: every wallet is marked dirty this often, to catch anything the
+# watchers cannot see (internal transfers, missed blocks, scoring changes)
+FULL_SWEEP_INTERVAL_SECONDS = float(os.getenv("SCORE_FULL_SWEEP_HOURS", 24)) * 3600
+# How often the loans table is checked for repayments, defaults and overdue
+# loans. Each check reads the open loans plus loans created since the last
+# one; both filters want an index:
+#   CREATE INDEX IF NOT EXISTS loans_status_idx ON loans (status);
+#   CREATE INDEX IF NOT EXISTS loans_created_at_idx ON loans (created_at);
+LOAN_POLL_INTERVAL_SECONDS = float(os.getenv("SCORE_LOAN_POLL_INTERVAL", 300))
+# New-loan lookups start this far before the last check, to absorb clock skew
+LOAN_POLL_OVERLAP_SECONDS = 60
+# How often the users table is re-read to pick up (and score) new users
+KNOWN_WALLETS_REFRESH_SECONDS = float(os.getenv("SCORE_KNOWN_WALLETS_REFRESH", 300))
+RESCORE_BATCH_SIZE = int(os.getenv("SCORE_RESCORE_BATCH_SIZE", 500))
+# A wallet that fails this many rescores in a row is left to the next full sweep
+DIRTY_MAX_ATTEMPTS = 5
+
+# --- Chain Polling Config ---
+# Blocks this close to the head are not read yet, so a short reorg cannot
+# make us miss activity
+BLOCK_CONFIRMATIONS = int(os.getenv("SCORE_BLOCK_CONFIRMATIONS", 2))
+MAX_BLOCKS_PER_POLL = int(os.getenv("SCORE_MAX_BLOCKS_PER_POLL", 500))
+LOGS_BLOCK_RANGE = 100
+# keccak256("Transfer(address,address,uint256)"), emitted by ERC-20 (and ERC-721) tokens
+TRANSFER_TOPIC = "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"
+
+
+class ChangeStore:
+    """
+    SQLite file holding the dirty set and the watchers' cursors, so a
+    restarted watcher neither loses pending work nor re-reads old blocks.
+
+    Tables:
+        dirty_wallets: wallet_id -> why it is dirty, when it was marked, failed attempts
+        open_loans: loan id -> borrower and outcome ('defaulted' once overdue, else '')
+            of every loan that was open (not repaid or defaulted) at the last check
+        watcher_state: small key/value cursors (last block, last full sweep, ...)
+
+    Args:
+        path (str): SQLite file to open (created if missing).
+    """
+    def __init__(self, path: str = CHANGE_STORE_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS dirty_wallets ("
+            " wallet_id TEXT PRIMARY KEY, reason TEXT, marked_at REAL, attempts INTEGER NOT NULL DEFAULT 0);"
+            "CREATE TABLE IF NOT EXISTS open_loans ("
+            " loan_id TEXT PRIMARY KEY, borrower_id TEXT, outcome TEXT);"
+            "CREATE TABLE IF NOT EXISTS watcher_state (key TEXT PRIMARY KEY, value TEXT);"
+        )
+
+    # --- Dirty Set ---
+    def mark_dirty(self, wallet_ids, reason: str):
+        """Adds wallets to the dirty set (re-marking one resets its attempts)."""
+        now = time.time()
+        rows = [(wallet_id, reason, now) for wallet_id in dict.fromkeys(wallet_ids)]
+        if not rows:
+            return 0
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO dirty_wallets (wallet_id, reason, marked_at, attempts) VALUES (?, ?, ?, 0)"
+                " ON CONFLICT(wallet_id) DO UPDATE SET reason = excluded.reason,"
+                " marked_at = excluded.marked_at, attempts = 0",
+                rows,
+            )
+        metrics.incr("wallets_marked_dirty_total", len(rows), reason=reason)
+        return len(rows)
+
+    def dirty_batch(self, limit: int, after_wallet_id: str = ""):
+        """Returns up to `limit` (wallet_id, marked_at) pairs with wallet_id > after_wallet_id."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT wallet_id, marked_at FROM dirty_wallets WHERE wallet_id > ? ORDER BY wallet_id LIMIT ?",
+                (after_wallet_id, limit),
+            ).fetchall()
+
+    def clear_dirty(self, entries):
+        """
+        Removes rescored wallets, given as (wallet_id, marked_at) pairs. A
+        wallet re-marked while it was being scored stays dirty.
+        """
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "DELETE FROM dirty_wallets WHERE wallet_id = ? AND marked_at <= ?", list(entries)
+            )
+
+    def record_failures(self, wallet_ids, max_attempts: int = DIRTY_MAX_ATTEMPTS):
+        """Counts a failed rescore; returns the wallets dropped after too many failures."""
+        wallet_ids = list(wallet_ids)
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE dirty_wallets SET attempts = attempts + 1 WHERE wallet_id = ?",
+                [(wallet_id,) for wallet_id in wallet_ids],
+            )
+            placeholders = ",".join("?" * len(wallet_ids))
+            dropped = [row[0] for row in self._conn.execute(
+                f"SELECT wallet_id FROM dirty_wallets WHERE attempts >= ? AND wallet_id IN ({placeholders})",
+                (max_attempts, *wallet_ids),
+            )] if wallet_ids else []
+            self._conn.executemany("DELETE FROM dirty_wallets WHERE wallet_id = ?", [(wallet_id,) for wallet_id in dropped])
+        return dropped
+
+    def dirty_count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM dirty_wallets").fetchone()[0]
+
+    # --- Loan Outcomes ---
+    def diff_loan_outcomes(self, rows):
+        """
+        Compares freshly read loans with the open loans stored last time and
+        returns the borrowers whose repayment counts may have changed.
+
+        `rows` are (loan_id, borrower_id, outcome, is_open) tuples covering
+        every open loan plus any loan created since the last check. A stored
+        open loan that is missing from `rows` has been closed (or deleted).
+        The diff runs as one join over a temporary table, not one query per loan.
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS seen_loans ("
+                " loan_id TEXT PRIMARY KEY, borrower_id TEXT, outcome TEXT, is_open INTEGER)"
+            )
+            self._conn.execute("DELETE FROM seen_loans")
+            # A loan read twice (open, then closed by the time of the second query) keeps its last state
+            self._conn.executemany("INSERT OR REPLACE INTO seen_loans VALUES (?, ?, ?, ?)", rows)
+
+            changed = {row[0] for row in self._conn.execute(
+                # New loans that already count, and loans whose outcome or borrower changed
+                "SELECT s.borrower_id FROM seen_loans s LEFT JOIN open_loans p ON p.loan_id = s.loan_id"
+                " WHERE CASE WHEN p.loan_id IS NULL THEN s.outcome != ''"
+                " ELSE p.outcome != s.outcome OR p.borrower_id IS NOT s.borrower_id END"
+                " UNION"
+                # Loans no longer open, and the previous borrower of reassigned loans
+                " SELECT p.borrower_id FROM open_loans p LEFT JOIN seen_loans s ON s.loan_id = p.loan_id"
+                " WHERE s.loan_id IS NULL OR p.borrower_id IS NOT s.borrower_id"
+            )}
+
+            self._conn.execute("DELETE FROM open_loans")
+            self._conn.execute(
+                "INSERT INTO open_loans SELECT loan_id, borrower_id, outcome FROM seen_loans WHERE is_open"
+            )
+            self._conn.execute("DELETE FROM seen_loans")
+        changed.discard(None)
+        return changed
+
+    # --- Cursors ---
+    def get_state(self, key: str, default=None):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM watcher_state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_state(self, key: str, value):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO watcher_state (key, value) VALUES (?, ?)"
+                " ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (key, str(value)),
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class KnownWallets:
+    """Lower-cased address -> wallet ID as stored in the users table."""
+    def __init__(self):
+        self.by_address = {}
+        self.refreshed_at = None
+
+    def refresh(self, supabase, page_size: int = USER_PAGE_SIZE):
+        """Re-reads the users table. Returns the wallet IDs that were not known before."""
+        by_address = {}
+        for page in iter_user_pages(supabase, page_size):
+            for wallet_id in page:
+                by_address[wallet_id.lower()] = wallet_id
+        new_ids = [wallet_id for address, wallet_id in by_address.items() if address not in self.by_address]
+        self.by_address = by_address
+        self.refreshed_at = time.monotonic()
+        return new_ids
+
+    def match(self, addresses):
+        """Returns the wallet IDs of the known addresses among `addresses`."""
+        return {self.by_address[address] for address in addresses if address in self.by_address}
+
+
+# --- Change Sources ---
+class ChainWatcher:
+    """
+    Polls the RPC node for new blocks and reports every known wallet that
+    sent or received ETH, or sent or received a token, in them.
+
+    Best pointed at a local node: it reads each new block in full, plus the
+    Transfer logs for the same range.
+    """
+    def __init__(self, store: ChangeStore, endpoint: str = None):
+        self.store = store
+        self.endpoint = endpoint or scoring_logic.ETH_RPC_ENDPOINT
+        self._w3 = None
+
+    def _get_w3(self):
+        if self._w3 is None:
+            from web3 import Web3
+            self._w3 = Web3(Web3.HTTPProvider(self.endpoint))
+        return self._w3
+
+    def _call(self, action: str, fn, *args):
+        """Runs one RPC call under the shared RPC rate limit."""
+        scoring_logic.rpc_limiter.acquire()
+        metrics.incr("upstream_calls_total", provider="rpc", action=action)
+        return fn(*args)
+
+    def touched_addresses(self, from_block: int, to_block: int):
+        """Returns every lower-cased address active in [from_block, to_block]."""
+        w3 = self._get_w3()
+        addresses = set()
+        for number in range(from_block, to_block + 1):
+            block = self._call("eth_getBlockByNumber", w3.eth.get_block, number, True)
+            for tx in block["transactions"]:
+                addresses.add((tx["from"] or "").lower())
+                addresses.add((tx.get("to") or "").lower())
+
+        for start in range(from_block, to_block + 1, LOGS_BLOCK_RANGE):
+            end = min(to_block, start + LOGS_BLOCK_RANGE - 1)
+            logs = self._call("eth_getLogs", w3.eth.get_logs, {"fromBlock": start, "toBlock": end, "topics": [TRANSFER_TOPIC]})
+            for log in logs:
+                # topics[1] / topics[2] are the indexed from / to, left-padded to 32 bytes
+                for topic in log["topics"][1:3]:
+                    addresses.add("0x" + bytes(topic)[-20:].hex())
+
+        addresses.discard("")
+        return addresses
+
+    def poll(self, known: KnownWallets):
+        """Reads the blocks since the last poll. Returns the known wallets they touched."""
+        head = self._call("eth_blockNumber", lambda: self._get_w3().eth.block_number) - BLOCK_CONFIRMATIONS
+        last_block = self.store.get_state("last_block")
+        if last_block is None:
+            # First run: start at the head; the initial full sweep covers the past
+            self.store.set_state("last_block", head)
+            return set()
+
+        from_block = int(last_block) + 1
+        to_block = min(head, from_block + MAX_BLOCKS_PER_POLL - 1)
+        if to_block < from_block:
+            return set()
+
+        with metrics.span("chain_poll"):
+            touched = known.match(self.touched_addresses(from_block, to_block))
+        self.store.set_state("last_block", to_block)
+        metrics.incr("blocks_scanned_total", to_block - from_block + 1)
+        return touched
+
+
+class LoanWatcher:
+    """
+    Detects borrowers whose repayment counts changed. The loans table has no
+    updated_at column, so every LOAN_POLL_INTERVAL_SECONDS it reads the loans
+    whose outcome can still change (open loans, which includes active loans
+    crossing their due date) plus loans created since the last check, and
+    diffs them against the open loans stored last time.
+
+    Args:
+        store (ChangeStore): Holds the open loans and the last check time.
+        interval (float): Seconds between checks.
+    """
+    def __init__(self, store: ChangeStore, interval: float = LOAN_POLL_INTERVAL_SECONDS):
+        self.store = store
+        self.interval = interval
+
+    def poll(self, supabase):
+        """
+        Returns the borrower IDs (lower-cased) whose loan outcomes changed,
+        or an empty set if the next check is not due yet.
+        """
+        last_poll = self.store.get_state("last_loan_poll")
+        if last_poll is not None and time.time() - float(last_poll) < self.interval:
+            return set()
+
+        polled_at = time.time()
+        now = datetime.fromtimestamp(polled_at, timezone.utc)
+        final_statuses = sorted(platform_history.GOOD_STATUSES | platform_history.DEFAULTED_STATUSES)
+
+        def loan_rows(where):
+            return iter_rows(supabase, platform_history.LOANS_TABLE, platform_history.LOAN_COLUMNS, where=where)
+
+        def outcome_rows(rows, is_open):
+            for row in rows:
+                yield (str(row["id"]), (row.get(platform_history.BORROWER_COLUMN) or "").lower() or None,
+                       platform_history.classify_loan(row.get("status"), row.get("due_date"), now) or "", is_open)
+
+        with metrics.span("loans_poll"):
+            open_rows = list(outcome_rows(loan_rows(lambda query: query.not_.in_("status", final_statuses)), 1))
+            if last_poll is None:
+                # First check: only remember the open loans; the initial full sweep covers the past
+                self.store.diff_loan_outcomes(open_rows)
+                self.store.set_state("last_loan_poll", polled_at)
+                return set()
+
+            since = datetime.fromtimestamp(float(last_poll) - LOAN_POLL_OVERLAP_SECONDS, timezone.utc).isoformat()
+            new_rows = loan_rows(lambda query: query.gt("created_at", since).in_("status", final_statuses))
+            changed = self.store.diff_loan_outcomes(open_rows + list(outcome_rows(new_rows, 0)))
+
+        self.store.set_state("last_loan_poll", polled_at)
+        metrics.incr("loans_scanned_total", len(open_rows))
+        return changed
+
+
+# --- Watcher Loop ---
+def rescore_dirty(store: ChangeStore, executor, writer, batch_size: int = RESCORE_BATCH_SIZE):
+    """
+    Makes one pass over the dirty set, in wallet ID order. Wallets that fail
+    stay dirty and are retried in the next pass.
+
+    Returns:
+        (tuple): (wallets rescored, wallets that failed)
+    """
+    scored_total, failed_total = 0, 0
+    after_wallet_id = ""
+    while True:
+        batch = store.dirty_batch(batch_size, after_wallet_id)
+        if not batch:
+            return scored_total, failed_total
+        wallet_ids = [wallet_id for wallet_id, _ in batch]
+        after_wallet_id = wallet_ids[-1]
+
+        repayment_histories = platform_history.get_repayment_histories(wallet_ids)
+        scored_ids = []
+        write_failed_before = len(writer.failed)
+        score_wallets(executor, writer, wallet_ids, repayment_histories, scored_ids)
+        writer.flush()
+
+        write_failed = {key for key, _ in writer.failed[write_failed_before:]}
+        succeeded = set(scored_ids) - write_failed
+        failed = [wallet_id for wallet_id in wallet_ids if wallet_id not in succeeded]
+
+        store.clear_dirty((wallet_id, marked_at) for wallet_id, marked_at in batch if wallet_id in succeeded)
+        for wallet_id in store.record_failures(failed):
+            print(f"WARNING: Giving up on {wallet_id} after {DIRTY_MAX_ATTEMPTS} failed rescores; the next full sweep will retry it.")
+
+        scored_total += len(succeeded)
+        failed_total += len(failed)
+        if not succeeded:
+            # Nothing in this batch went through (provider down?); wait for the next cycle
+            return scored_total, failed_total
+
+
+def run_watcher(poll_interval: float = POLL_INTERVAL_SECONDS, full_sweep_interval: float = FULL_SWEEP_INTERVAL_SECONDS,
+                max_workers: int = MAX_WORKERS, store_path: str = CHANGE_STORE_PATH, watch_chain: bool = True, once: bool = False,
+                loan_poll_interval: float = LOAN_POLL_INTERVAL_SECONDS):
+    """
+    Keeps scores fresh by rescoring only wallets with new activity.
+
+    Each cycle: re-read the users table if due (new users are dirty), mark
+    wallets touched by new blocks or (when a loan check is due) by loan
+    changes, mark everyone if a full sweep is due, then rescore the dirty set.
+
+    Args:
+        poll_interval (float): Seconds between cycles.
+        full_sweep_interval (float): Seconds between fallback full sweeps.
+        max_workers (int): Wallets scored in parallel.
+        store_path (str): SQLite file for the dirty set and cursors.
+        watch_chain (bool): Poll the RPC node for new blocks.
+        once (bool): Run a single cycle and return.
+        loan_poll_interval (float): Seconds between checks of the loans table.
+    """
+    print(f"Starting score-on-change watcher (TEST_MODE = {TEST_MODE}, workers = {max_workers})...")
+
+    supabase = connect_supabase()
+    if supabase is None:
+        return
+    platform_history.set_client(supabase)
+
+    store = ChangeStore(store_path)
+    known = KnownWallets()
+    chain = ChainWatcher(store) if watch_chain else None
+    loans = LoanWatcher(store, loan_poll_interval)
+
+    writer = build_score_writer(supabase, WRITE_BATCH_SIZE, WRITE_FLUSH_SECONDS)
+    with writer, ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        while True:
+            started = time.monotonic()
+            try:
+                if known.refreshed_at is None or time.monotonic() - known.refreshed_at >= KNOWN_WALLETS_REFRESH_SECONDS:
+                    first_refresh = known.refreshed_at is None
+                    new_ids = known.refresh(supabase)
+                    # On startup every user is "new"; the sweep check below decides
+                    if not first_refresh:
+                        store.mark_dirty(new_ids, "new_user")
+
+                last_sweep = float(store.get_state("last_full_sweep", 0))
+                if time.time() - last_sweep >= full_sweep_interval:
+                    count = store.mark_dirty(known.by_address.values(), "full_sweep")
+                    store.set_state("last_full_sweep", time.time())
+                    print(f"SWEEP: Marked all {count} wallets for rescoring.")
+
+                if chain is not None:
+                    touched = chain.poll(known)
+                    for wallet_id in touched:
+                        scoring_logic.invalidate_wallet_features(wallet_id)
+                    store.mark_dirty(touched, "chain")
+
+                changed_borrowers = known.match(loans.poll(supabase))
+                platform_history.invalidate_repayment_histories(changed_borrowers)
+                store.mark_dirty(changed_borrowers, "loans")
+
+                pending = store.dirty_count()
+                if pending:
+                    print(f"Rescoring {pending} dirty wallets...")
+                    scored, failed = rescore_dirty(store, executor, writer)
+                    print(f"RESCORED: {scored} updated, {failed} failed, {store.dirty_count()} still dirty.")
+
+            except Exception as e:
+                print(f"ERROR: Score-on-change cycle failed; retrying next cycle. {e}")
+
+            if once:
+                break
+            time.sleep(max(0.0, poll_interval - (time.monotonic() - started)))
+
+    store.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rescore wallets as their on-chain or platform activity changes.")
+    parser.add_argument("--poll-interval", type=float, default=POLL_INTERVAL_SECONDS, help="Seconds between cycles.")
+    parser.add_argument("--loan-poll-interval", type=float, default=LOAN_POLL_INTERVAL_SECONDS, help="Seconds between checks of the loans table.")
+    parser.add_argument("--full-sweep-hours", type=float, default=FULL_SWEEP_INTERVAL_SECONDS / 3600, help="Hours between fallback full sweeps.")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS, help="Wallets scored in parallel.")
+    parser.add_argument("--store", default=CHANGE_STORE_PATH, help="SQLite file for the dirty set and cursors.")
+    parser.add_argument("--no-chain", action="store_true", help="Only watch the loans table, not new blocks.")
+    parser.add_argument("--once", action="store_true", help="Run one cycle and exit.")
+    parser.add_argument("--metrics-port", type=int, default=metrics.METRICS_PORT, help="Prometheus port for this process.")
+    args = parser.parse_args()
+
+    metrics.configure(port=args.metrics_port)
+
+    run_watcher(args.poll_interval, args.full_sweep_hours * 3600, args.workers, args.store, not args.no_chain, args.once,
+                args.loan_poll_interval)
@@ -0,0 +1,144 @@
+# score_writer.py
+
+import queue
+import threading
+import time
+import metrics
+
+_STOP = object()
+
+
+class ScoreWriter:
+    """
+    Write-behind buffer for score updates.
+
+    Rows handed to add() are queued and written by a background thread as
+    chunked bulk updates, so scoring workers never wait on the database and
+    a batch of N users costs about N / batch_size round trips.
+
+    A chunk that fails is retried with exponential backoff; if it still
+    fails, its rows are retried one by one so a single bad row cannot sink
+    the rest. Rows that fail individually, and rows whose key matched no
+    existing record (e.g. a user deleted mid-run), are reported in `failed`.
+
+    Args:
+        write_rows (callable): Writes one chunk of rows in a single round trip
+            and returns the keys it actually updated.
+        key_column (str): Column identifying a row (e.g. "wallet_id").
+        batch_size (int): Max rows per write.
+        flush_interval (float): Max seconds a queued row waits before it is written.
+        max_retries (int): Attempts per chunk before falling back to single rows.
+        retry_backoff (float): Base delay (seconds) between chunk retries.
+    """
+    def __init__(self, write_rows, key_column: str, batch_size: int = 500, flush_interval: float = 2.0,
+                 max_retries: int = 3, retry_backoff: float = 1.0):
+        self.write_rows = write_rows
+        self.key_column = key_column
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_retries = max(1, max_retries)
+        self.retry_backoff = retry_backoff
+
+        self.written = 0
+        self.failed = []  # (key, error message) per row that could not be written
+        self.round_trips = 0
+
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="score-writer", daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def add(self, row: dict):
+        """Queues one row (must include key_column). Never blocks on the database."""
+        self._queue.put(row)
+
+    def flush(self):
+        """Blocks until every row queued so far has been written (or reported failed)."""
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait()
+
+    def close(self):
+        """Flushes everything still queued and stops the writer thread."""
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def _run(self):
+        pending = []
+        deadline = None
+
+        while True:
+            timeout = max(0.0, deadline - time.monotonic()) if pending else None
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                self._flush(pending)
+                return
+
+            if isinstance(item, threading.Event):
+                self._flush(pending)
+                pending = []
+                item.set()
+                continue
+
+            if item is not None:
+                if not pending:
+                    deadline = time.monotonic() + self.flush_interval
+                pending.append(item)
+
+            if len(pending) >= self.batch_size or (pending and time.monotonic() >= deadline):
+                self._flush(pending)
+                pending = []
+
+    def _flush(self, rows: list):
+        for start in range(0, len(rows), self.batch_size):
+            self._write_chunk(rows[start:start + self.batch_size])
+
+    def _update(self, rows: list):
+        """Writes rows in one round trip; rows that matched no record are reported failed."""
+        self.round_trips += 1
+        metrics.incr("db_calls_total", table="users", action="update")
+        with metrics.span("db_update", table="users"):
+            updated = set(self.write_rows(rows))
+
+        for row in rows:
+            key = row.get(self.key_column)
+            if key in updated:
+                self.written += 1
+                metrics.incr("db_rows_written_total")
+            else:
+                print(f"FAILED: Could not update {key}. Error: no existing row")
+                self.failed.append((key, "no existing row"))
+                metrics.incr("db_rows_failed_total")
+        return len(updated)
+
+    def _write_chunk(self, chunk: list):
+        # --- 1. Try the whole chunk, with backoff ---
+        for attempt in range(self.max_retries):
+            try:
+                updated = self._update(chunk)
+                print(f"SUCCESS: Wrote {updated} scores in one update.")
+                return
+            except Exception as e:
+                print(f"WARNING: Bulk update of {len(chunk)} rows failed (attempt {attempt + 1}/{self.max_retries}). Error: {e}")
+                if attempt + 1 < self.max_retries:
+                    metrics.incr("retries_total", provider="supabase")
+                    time.sleep(self.retry_backoff * (2 ** attempt))
+
+        # --- 2. Isolate the bad rows ---
+        for row in chunk:
+            try:
+                self._update([row])
+            except Exception as e:
+                key = row.get(self.key_column)
+                print(f"FAILED: Could not update {key}. Error: {e}")
+                self.failed.append((key, str(e)))
+                metrics.incr("db_rows_failed_total")
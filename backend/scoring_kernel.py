@@ -0,0 +1,152 @@
+# scoring_kernel.py
+
+import time
+import numpy as np
+
+# --- Score Weights ---
+WEIGHTS = {
+    "platform_repayment_good": 150,
+    "platform_repayment_bad": -300,
+    "wallet_age_days": 1.5,
+    "eth_balance": 50,
+    "tx_count": 0.5,
+    "erc20_token_count": 10
+}
+
+BALANCE_SCORE_CAP = 200
+MIN_SCORE = 300
+MAX_SCORE = 850
+LOW_RISK_ABOVE = 700
+MEDIUM_RISK_ABOVE = 550
+
+# Column order of a feature matrix (these are also the analysis_breakdown keys)
+FEATURE_NAMES = (
+    "platform_good_loans",
+    "platform_defaulted_loans",
+    "eth_balance",
+    "wallet_age_days",
+    "transaction_count",
+    "erc20_token_variety_count",
+)
+# Saved with every score (see feature_record) so the whole user base can be
+# re-scored offline; first_tx_timestamp lets wallet_age_days be recomputed
+STORED_FEATURE_NAMES = FEATURE_NAMES + ("first_tx_timestamp",)
+
+
+def build_feature_matrix(analyses):
+    """
+    Builds an (N, len(FEATURE_NAMES)) float matrix from analysis_breakdown
+    dicts (missing features count as 0).
+
+    Args:
+        analyses (iterable): One analysis_breakdown dict per wallet.
+
+    Returns:
+        (np.ndarray): The feature matrix.
+    """
+    return np.array(
+        [[float(analysis.get(name, 0) or 0) for name in FEATURE_NAMES] for analysis in analyses],
+        dtype=np.float64,
+    ).reshape(-1, len(FEATURE_NAMES))
+
+
+def score_components(features: np.ndarray, weights: dict = None):
+    """
+    Computes every partial score for N wallets in one vectorised pass.
+
+    The additions happen in the same order as the original per-wallet code,
+    so float results are bit-for-bit identical to the scalar path.
+
+    Args:
+        features (np.ndarray): (N, len(FEATURE_NAMES)) matrix, see FEATURE_NAMES.
+        weights (dict): Score weights; defaults to WEIGHTS.
+
+    Returns:
+        (dict): Arrays for platform_score, balance_score, age_score, tx_score,
+                token_score and raw_score (the sum of them all).
+    """
+    weights = weights or WEIGHTS
+    features = np.asarray(features, dtype=np.float64).reshape(-1, len(FEATURE_NAMES))
+    good, defaulted, eth_balance, age_days, tx_count, token_count = features.T
+
+    platform_score = good * weights["platform_repayment_good"] + defaulted * weights["platform_repayment_bad"]
+    balance_score = np.minimum(eth_balance * weights["eth_balance"], BALANCE_SCORE_CAP)
+    age_score = age_days * weights["wallet_age_days"]
+    tx_score = tx_count * weights["tx_count"]
+    token_score = token_count * weights["erc20_token_count"]
+
+    raw_score = platform_score + balance_score
+    raw_score = raw_score + (age_score + tx_score)
+    raw_score = raw_score + token_score
+
+    return {
+        "platform_score": platform_score,
+        "balance_score": balance_score,
+        "age_score": age_score,
+        "tx_score": tx_score,
+        "token_score": token_score,
+        "raw_score": raw_score,
+    }
+
+
+def finalize_scores(raw_scores: np.ndarray):
+    """
+    Clamps raw scores into the 300-850 range and buckets them into risk levels.
+
+    Args:
+        raw_scores (np.ndarray): Summed partial scores.
+
+    Returns:
+        (tuple): (int64 array of final scores, array of "low"/"medium"/"high")
+    """
+    # np.rint rounds half to even, exactly like Python's round()
+    final_scores = np.rint(np.clip(MIN_SCORE + np.asarray(raw_scores, dtype=np.float64), MIN_SCORE, MAX_SCORE)).astype(np.int64)
+    risk_levels = np.where(final_scores > LOW_RISK_ABOVE, "low", np.where(final_scores > MEDIUM_RISK_ABOVE, "medium", "high"))
+    return final_scores, risk_levels
+
+
+def score_features(features: np.ndarray, weights: dict = None):
+    """
+    Scores N wallets from their feature matrix without any network calls.
+
+    Args:
+        features (np.ndarray): (N, len(FEATURE_NAMES)) matrix, see FEATURE_NAMES.
+        weights (dict): Score weights; defaults to WEIGHTS.
+
+    Returns:
+        (tuple): (int64 array of final scores, array of risk levels)
+    """
+    return finalize_scores(score_components(features, weights)["raw_score"])
+
+
+def feature_record(analysis: dict):
+    """Returns the part of an analysis_breakdown that is saved for offline re-scoring."""
+    return {name: analysis.get(name) for name in STORED_FEATURE_NAMES}
+
+
+def score_feature_records(records, weights: dict = None, now: float = None):
+    """
+    Re-scores N wallets from saved feature records (see feature_record),
+    e.g. after a WEIGHTS change, without any network calls.
+
+    wallet_age_days is recomputed from first_tx_timestamp as of `now`;
+    everything else (balance, counts) is as of when the record was saved.
+
+    Args:
+        records (iterable): One feature record dict per wallet.
+        weights (dict): Score weights; defaults to WEIGHTS.
+        now (float): Unix time to age wallets to; defaults to the current time.
+
+    Returns:
+        (tuple): (int64 array of final scores, array of risk levels)
+    """
+    records = list(records)
+    features = build_feature_matrix(records)
+    first_tx = np.array([record.get("first_tx_timestamp") or np.nan for record in records], dtype=np.float64)
+
+    # Same rule as the online path: age counts only for wallets with transactions
+    now = time.time() if now is None else now
+    has_age = (features[:, FEATURE_NAMES.index("transaction_count")] > 0) & ~np.isnan(first_tx)
+    age_days = np.floor((now - np.where(has_age, first_tx, now)) / 86400)
+    features[:, FEATURE_NAMES.index("wallet_age_days")] = np.where(has_age, age_days, features[:, FEATURE_NAMES.index("wallet_age_days")])
+    return score_features(features, weights)
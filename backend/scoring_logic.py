@@ -1,123 +1,591 @@
 # scoring_logic.py
 
 import os
-import requests
-from web3 import Web3
+import time
+import atexit
+import asyncio
+import threading
+import weakref
 from datetime import datetime, timezone
 from dotenv import load_dotenv
+import metrics
+from rate_limit import RateLimiter
+from providers import ProviderClient, ProviderError, RetryableProviderError, RateLimitedError, classify_rpc_error, raise_for_http_status
+from feature_cache import build_feature_cache
+from scoring_kernel import WEIGHTS, build_feature_matrix, score_components, finalize_scores
+from platform_history import get_repayment_history
+from wallet_history import WalletHistoryStore, merge_tx_rows, merge_token_rows
 
 # --- Load Config from .env ---
 load_dotenv()
 ETH_RPC_ENDPOINT = os.getenv("ETH_RPC_ENDPOINT")
 ETHERSCAN_API_KEY = os.getenv("ETHERSCAN_API_KEY")
-ETHERSCAN_API_URL = "https://api-sepolia.etherscan.io/api"
+ETHERSCAN_API_URL = os.getenv("ETHERSCAN_API_URL", "https://api-sepolia.etherscan.io/api")
+
+# --- Provider Rate Limits (calls per second, shared by all worker threads) ---
+# Etherscan's free tier allows 5 calls/sec per API key
+ETHERSCAN_CALLS_PER_SECOND = float(os.getenv("ETHERSCAN_CALLS_PER_SECOND", 5))
+RPC_CALLS_PER_SECOND = float(os.getenv("RPC_CALLS_PER_SECOND", 10))
+
+etherscan_limiter = RateLimiter(ETHERSCAN_CALLS_PER_SECOND, burst=int(ETHERSCAN_CALLS_PER_SECOND))
+rpc_limiter = RateLimiter(RPC_CALLS_PER_SECOND, burst=int(RPC_CALLS_PER_SECOND))
+
+# Retry, backoff and circuit breaking around each provider (see providers.py)
+etherscan_client = ProviderClient("etherscan", etherscan_limiter)
+rpc_client = ProviderClient("rpc", rpc_limiter)
+
+# --- HTTP Connection Pool Config ---
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", 20))
+HTTP_TIMEOUT_SECONDS = float(os.getenv("HTTP_TIMEOUT_SECONDS", 30))
+
+# --- Feature Cache Config ---
+# "memory" (default), "sqlite" (survives restarts) or "off"
+FEATURE_CACHE_BACKEND = os.getenv("FEATURE_CACHE", "memory")
+FEATURE_CACHE_PATH = os.getenv("FEATURE_CACHE_PATH", "feature_cache.sqlite3")
+FEATURE_CACHE_MAX_ROWS = int(os.getenv("FEATURE_CACHE_MAX_ROWS", 200000))
+
+# --- Incremental History Sync Config ---
+WALLET_HISTORY_PATH = os.getenv("WALLET_HISTORY_PATH", "wallet_history.sqlite3")
+ETHERSCAN_END_BLOCK = 99999999
+
+# --- Etherscan Pagination ---
+# Etherscan never returns more than 10,000 rows for one (startblock, endblock)
+# query, however it is paged, so long histories are walked in windows.
+ETHERSCAN_PAGE_SIZE = int(os.getenv("ETHERSCAN_PAGE_SIZE", 2000))
+ETHERSCAN_RESULT_WINDOW = 10000
+# Etherscan "NOTOK" results that are transient (query timeouts on heavy
+# wallets, overloaded backend) and worth retrying, unlike a bad key or address
+ETHERSCAN_RETRYABLE_HINTS = ("timeout", "server too busy", "server is busy", "try again later")
+
+# --- Request Coalescing / Micro-Batching ---
+# Balance lookups arriving within RPC_BATCH_WINDOW_MS of each other go out as
+# one JSON-RPC batch of up to RPC_BATCH_SIZE calls (1 disables batching).
+RPC_BATCH_SIZE = int(os.getenv("RPC_BATCH_SIZE", 50))
+RPC_BATCH_WINDOW_MS = float(os.getenv("RPC_BATCH_WINDOW_MS", 5))
+
+# --- Provider Health Check ---
+# A successful check is trusted for this long instead of costing an extra RPC
+# round trip on every score.
+HEALTH_CHECK_TTL_SECONDS = float(os.getenv("RPC_HEALTH_CHECK_TTL", 30))
 
 # --- Shared Variables ---
-try:
-    w3 = Web3(Web3.HTTPProvider(ETH_RPC_ENDPOINT))
-except Exception as e:
-    print(f"ERROR: Could not connect to Infura. Check ETH_RPC_ENDPOINT. {e}")
-    w3 = None
-
-WEIGHTS = {
-    "platform_repayment_good": 150,
-    "platform_repayment_bad": -300,
-    "wallet_age_days": 1.5,
-    "eth_balance": 50,
-    "tx_count": 0.5,
-    "erc20_token_count": 10
-}
-
-# --- Mock DB Function ---
+# Everything below is created on first use, so importing this module stays
+# cheap (aiohttp alone takes a noticeable part of a second to import).
+_last_healthy_at = None
+
+# Cache for raw wallet inputs, keyed by checksum address
+feature_cache = None
+
+# Per-wallet aggregates + block checkpoints, so re-scoring only fetches new blocks
+wallet_history = None
+_stores_lock = threading.Lock()
+
+# One pooled HTTP session per event loop (aiohttp sessions are loop-bound),
+# used for Etherscan and for batched JSON-RPC calls
+_http_sessions = weakref.WeakKeyDictionary()
+
+# In-flight work per event loop: key -> task, so concurrent callers share it
+_in_flight = weakref.WeakKeyDictionary()
+_balance_batchers = weakref.WeakKeyDictionary()
+
+# Background loop used by the sync wrapper, started on first use
+_sync_loop = None
+_sync_loop_lock = threading.Lock()
+
+# --- Platform DB Function ---
 def get_platform_repayment_history(wallet_address: str):
-    # In a real app, you'd query Supabase for this user's loan history
-    return (0, 0)
+    """
+    Returns (good_loans, defaulted_loans) from the platform's loans table.
+    Served from the batch cache when update_scores has already prefetched it.
+    """
+    return get_repayment_history(wallet_address)
+
+# --- Lazily Built Shared Objects ---
+async def _ensure_provider_healthy():
+    """
+    Raises if the RPC provider is unreachable. A passing check is cached for
+    HEALTH_CHECK_TTL_SECONDS, so steady-state scoring makes no extra RPC call.
+    """
+    if not ETH_RPC_ENDPOINT:
+        raise RetryableProviderError("Web3 provider not connected. Check your ETH_RPC_ENDPOINT.")
+
+    if _last_healthy_at is not None and time.monotonic() - _last_healthy_at < HEALTH_CHECK_TTL_SECONDS:
+        return
+
+    # Callers arriving while a check is running wait for it instead of starting their own
+    await _single_flight(("health_check",), _check_provider_health)
+
+async def _check_provider_health():
+    global _last_healthy_at
+    metrics.incr("upstream_calls_total", provider="rpc", action="health_check")
+    try:
+        await _rpc_request("eth_blockNumber", [])
+        connected = True
+    except Exception as e:
+        print(f"ERROR: Could not connect to Infura. Check ETH_RPC_ENDPOINT. {e}")
+        connected = False
+
+    if not connected:
+        _last_healthy_at = None
+        raise RetryableProviderError("Web3 provider not connected. Check your ETH_RPC_ENDPOINT.")
+    _last_healthy_at = time.monotonic()
+
+def _get_feature_cache():
+    """Returns the raw-input cache, opening the configured backend on first use."""
+    global feature_cache
+    if feature_cache is None:
+        with _stores_lock:
+            if feature_cache is None:
+                feature_cache = build_feature_cache(FEATURE_CACHE_BACKEND, FEATURE_CACHE_PATH, FEATURE_CACHE_MAX_ROWS)
+    return feature_cache
+
+def _get_wallet_history():
+    """Returns the wallet history store, opening its SQLite file on first use."""
+    global wallet_history
+    if wallet_history is None:
+        with _stores_lock:
+            if wallet_history is None:
+                wallet_history = WalletHistoryStore(WALLET_HISTORY_PATH)
+    return wallet_history
+
+# --- Pooled Upstream Clients ---
+def _get_http_session():
+    """Returns the keep-alive HTTP session for the running event loop."""
+    import aiohttp
+
+    loop = asyncio.get_running_loop()
+    session = _http_sessions.get(loop)
+    if session is None or session.closed:
+        session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=HTTP_POOL_SIZE),
+            timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT_SECONDS),
+        )
+        _http_sessions[loop] = session
+    return session
+
+def _check_etherscan_response(data: dict):
+    """
+    Raises if an Etherscan response is an error rather than a (possibly
+    empty) result. Etherscan answers throttled calls with HTTP 200 and
+    status "0", which must not be read as "this wallet has no history".
+    """
+    result = data.get("result")
+    if data.get("status") == "1" or isinstance(result, list):
+        return
+    message = f"{data.get('message')}: {result}"
+    lowered = str(result).lower()
+    if any(hint in lowered for hint in ("rate limit", "max calls per sec")):
+        raise RateLimitedError(f"Etherscan rate limit: {message}")
+    if any(hint in lowered for hint in ETHERSCAN_RETRYABLE_HINTS):
+        raise RetryableProviderError(f"Etherscan busy: {message}")
+    raise ProviderError(f"Etherscan error: {message}")
+
+async def _etherscan_request(params: dict):
+    """Makes one Etherscan HTTP request and returns the decoded JSON."""
+    session = _get_http_session()
+    async with session.get(ETHERSCAN_API_URL, params={**params, "apikey": ETHERSCAN_API_KEY}) as response:
+        raise_for_http_status(response.status, f"Etherscan {params.get('action')}")
+        data = await response.json(content_type=None)
+    _check_etherscan_response(data)
+    return data
+
+async def _etherscan_get(params: dict):
+    """Makes one rate-limited, retried Etherscan API call and returns the decoded JSON."""
+    return await etherscan_client.call(_etherscan_request, params, action=params.get("action"))
+
+async def _rpc_request(method: str, params: list):
+    """Makes one JSON-RPC call over the pooled HTTP session and returns its result."""
+    session = _get_http_session()
+    async with session.post(ETH_RPC_ENDPOINT, json={"jsonrpc": "2.0", "id": 1, "method": method, "params": params}) as response:
+        raise_for_http_status(response.status, f"RPC {method}")
+        reply = await response.json(content_type=None)
+    if isinstance(reply, dict) and "result" in reply:
+        return reply["result"]
+    raise classify_rpc_error(reply.get("error", reply) if isinstance(reply, dict) else reply)
+
+async def _get_balance_wei(checksum_address: str):
+    return int(await _rpc_request("eth_getBalance", [checksum_address, "latest"]), 16)
+
+async def _rpc_batch_get_balance(addresses: list):
+    """
+    Sends one JSON-RPC batch of eth_getBalance calls.
+
+    Returns:
+        (dict): address -> balance in wei, or the ProviderError for that address.
+    """
+    payload = [{"jsonrpc": "2.0", "id": i, "method": "eth_getBalance", "params": [address, "latest"]} for i, address in enumerate(addresses)]
+    session = _get_http_session()
+    async with session.post(ETH_RPC_ENDPOINT, json=payload) as response:
+        raise_for_http_status(response.status, "RPC eth_getBalance batch")
+        replies = await response.json(content_type=None)
+    if not isinstance(replies, list):
+        # Some nodes answer a whole rejected batch with a single error object
+        raise classify_rpc_error(replies.get("error", replies) if isinstance(replies, dict) else replies)
+
+    results = {}
+    for reply in replies:
+        if not isinstance(reply.get("id"), int) or not 0 <= reply["id"] < len(addresses):
+            continue
+        address = addresses[reply["id"]]
+        error = reply.get("error")
+        if error is None:
+            results[address] = int(reply["result"], 16)
+            continue
+        error = classify_rpc_error(error)
+        if isinstance(error, RetryableProviderError):
+            # Throttled or flaky: let the client retry the whole batch
+            raise error
+        results[address] = error
+    missing = [address for address in addresses if address not in results]
+    if missing:
+        raise RetryableProviderError(f"RPC batch reply is missing {len(missing)} of {len(addresses)} results")
+    return results
+
+class _BalanceBatcher:
+    """
+    Collects balance lookups made on one event loop and sends them as
+    JSON-RPC batches: after RPC_BATCH_WINDOW_MS, or as soon as RPC_BATCH_SIZE
+    distinct addresses are waiting. Each batch costs one rate-limiter token.
+    """
+    def __init__(self, loop):
+        self.loop = loop
+        self.pending = {}  # address -> future
+        self._timer = None
+
+    def get(self, checksum_address: str):
+        future = self.pending.get(checksum_address)
+        if future is None:
+            future = self.pending[checksum_address] = self.loop.create_future()
+            if len(self.pending) >= RPC_BATCH_SIZE:
+                self._flush()
+            elif self._timer is None:
+                self._timer = self.loop.call_later(RPC_BATCH_WINDOW_MS / 1000, self._flush)
+        return future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self.pending = self.pending, {}
+        if batch:
+            self.loop.create_task(self._send(batch))
+
+    async def _send(self, batch: dict):
+        metrics.incr("rpc_batch_calls_total", len(batch))
+        try:
+            results = await rpc_client.call(_rpc_batch_get_balance, list(batch), action="eth_getBalance_batch")
+        except Exception as e:
+            results = {address: e for address in batch}
+        for address, future in batch.items():
+            if future.done():
+                continue
+            value = results[address]
+            if isinstance(value, Exception):
+                future.set_exception(value)
+            else:
+                future.set_result(value)
+
+async def _fetch_balance(checksum_address: str):
+    """
+    Fetches the wallet's ETH balance (as a float). Lookups from concurrent
+    callers are micro-batched into one JSON-RPC request.
+    """
+    from eth_utils import from_wei
+
+    if RPC_BATCH_SIZE > 1:
+        loop = asyncio.get_running_loop()
+        batcher = _balance_batchers.get(loop)
+        if batcher is None:
+            batcher = _balance_batchers[loop] = _BalanceBatcher(loop)
+        balance_wei = await batcher.get(checksum_address)
+    else:
+        balance_wei = await rpc_client.call(_get_balance_wei, checksum_address, action="eth_getBalance")
+    return float(from_wei(balance_wei, 'ether'))
+
+def _etherscan_rows(data: dict):
+    """Returns the result rows of an Etherscan response ([] when there are none)."""
+    # Robust check using .get()
+    if data.get("status") == "1" and data.get("result"):
+        return data["result"]
+    return []
+
+def _row_key(row: dict):
+    """Identifies a row so the overlap between two result windows can be skipped."""
+    return (row.get('hash'), row.get('logIndex'), row.get('contractAddress'), row.get('from'), row.get('to'), row.get('value'))
+
+async def _iter_etherscan_pages(params: dict):
+    """
+    Streams an account query (txlist / tokentx) page by page, oldest first.
+
+    Pages hold at most ETHERSCAN_PAGE_SIZE rows, so memory stays flat no
+    matter how long the wallet's history is. When a result window is full,
+    the next window restarts at the last block seen; rows from that block
+    that were already yielded are skipped.
+
+    Args:
+        params (dict): Etherscan query params, including "startblock".
+
+    Yields:
+        (list): The next page of rows.
+    """
+    start_block = params["startblock"]
+    pages_per_window = max(1, ETHERSCAN_RESULT_WINDOW // ETHERSCAN_PAGE_SIZE)
+
+    # Keys of the rows seen in the most recent block, for de-duplication
+    last_block = None
+    last_block_keys = set()
+
+    while True:
+        window_start = start_block
+        for page in range(1, pages_per_window + 1):
+            data = await _etherscan_get({**params, "startblock": start_block, "page": page, "offset": ETHERSCAN_PAGE_SIZE})
+            rows = _etherscan_rows(data)
+            metrics.incr("rows_fetched_total", len(rows), action=params.get("action"))
+
+            fresh = []
+            for row in rows:
+                block = int(row['blockNumber'])
+                key = _row_key(row)
+                if block != last_block:
+                    last_block = block
+                    last_block_keys = set()
+                elif key in last_block_keys:
+                    continue
+                last_block_keys.add(key)
+                fresh.append(row)
+
+            if fresh:
+                yield fresh
+            if len(rows) < ETHERSCAN_PAGE_SIZE:
+                return
+
+        # Window is full: restart at the last block seen
+        start_block = last_block
+        if start_block == window_start:
+            # A single block holds more rows than a whole window; nothing
+            # more can be fetched for it, so move on to the next block
+            print(f"WARNING: Block {start_block} has more than {ETHERSCAN_RESULT_WINDOW} rows for {params.get('address')}; skipping the rest of it.")
+            start_block += 1
+
+async def _fetch_tx_summary(checksum_address: str):
+    """
+    Syncs the wallet's txlist from its last checkpoint and returns the
+    count + first timestamp over its whole history.
+    """
+    history = _get_wallet_history().load(checksum_address)
+    tx_params = {"module": "account", "action": "txlist", "address": checksum_address, "startblock": history["tx_last_block"] + 1, "endblock": ETHERSCAN_END_BLOCK, "sort": "asc"}
+
+    merged = dict(history)
+    async for rows in _iter_etherscan_pages(tx_params):
+        merged.update(merge_tx_rows(merged, rows))
+
+    if merged["tx_last_block"] != history["tx_last_block"]:
+        _get_wallet_history().save_tx(checksum_address, merged["tx_count"], merged["first_tx_timestamp"], merged["tx_last_block"])
+    return {"tx_count": merged["tx_count"], "first_tx_timestamp": merged["first_tx_timestamp"]}
+
+async def _fetch_token_set(checksum_address: str):
+    """
+    Syncs the wallet's tokentx history from its last checkpoint and returns
+    the distinct token symbols over its whole history.
+    """
+    history = _get_wallet_history().load(checksum_address)
+    token_params = {"module": "account", "action": "tokentx", "address": checksum_address, "startblock": history["token_last_block"] + 1, "endblock": ETHERSCAN_END_BLOCK, "sort": "asc"}
+
+    merged = dict(history)
+    async for rows in _iter_etherscan_pages(token_params):
+        merged.update(merge_token_rows(merged, rows))
+
+    if merged["token_last_block"] != history["token_last_block"]:
+        _get_wallet_history().save_tokens(checksum_address, merged["tokens"], merged["token_last_block"])
+    return merged["tokens"]
+
+async def _single_flight(key: tuple, make_coroutine):
+    """
+    Runs make_coroutine() once for all concurrent callers with the same key
+    (on this event loop) and gives each of them its result. A caller that is
+    cancelled does not cancel the shared work.
+    """
+    loop = asyncio.get_running_loop()
+    calls = _in_flight.get(loop)
+    if calls is None:
+        calls = _in_flight[loop] = {}
+
+    task = calls.get(key)
+    if task is None:
+        task = calls[key] = loop.create_task(make_coroutine())
+        task.add_done_callback(lambda _: calls.pop(key, None))
+    else:
+        metrics.incr("coalesced_calls_total", kind=key[0])
+    return await asyncio.shield(task)
+
+async def _cached_feature(checksum_address: str, feature: str, fetch):
+    """
+    Returns a raw input from feature_cache, fetching and storing it on a miss.
+    Concurrent misses for the same wallet and feature share one fetch.
+    """
+    cache = _get_feature_cache()
+    value = cache.get(checksum_address, feature)
+    if value is not None:
+        metrics.incr("cache_requests_total", feature=feature, result="hit")
+        return value
+
+    metrics.incr("cache_requests_total", feature=feature, result="miss")
+
+    async def fetch_and_store():
+        fetched = await fetch(checksum_address)
+        cache.set(checksum_address, feature, fetched)
+        return fetched
+
+    return await _single_flight((feature, checksum_address), fetch_and_store)
+
+def set_feature_cache(cache):
+    """Swaps in a different FeatureCache backend (e.g. a shared SQLiteFeatureCache)."""
+    global feature_cache
+    feature_cache = cache
+
+def invalidate_wallet_features(wallet_address: str):
+    """Drops a wallet's cached on-chain inputs so its next score refetches them."""
+    from eth_utils import is_address, to_checksum_address
+
+    if feature_cache is None or not is_address(wallet_address):
+        return
+    feature_cache.invalidate(to_checksum_address(wallet_address))
+
+async def close_async_clients():
+    """Closes the pooled HTTP session for the running event loop."""
+    session = _http_sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None and not session.closed:
+        await session.close()
+
+def _get_sync_loop():
+    """Starts (once) a daemon thread running the event loop behind the sync API."""
+    global _sync_loop
+    with _sync_loop_lock:
+        if _sync_loop is None:
+            _sync_loop = asyncio.new_event_loop()
+            threading.Thread(target=_sync_loop.run_forever, name="scoring-loop", daemon=True).start()
+            atexit.register(_close_sync_loop_clients)
+    return _sync_loop
+
+def _close_sync_loop_clients():
+    """Closes the sync loop's pooled sessions at interpreter exit."""
+    try:
+        asyncio.run_coroutine_threadsafe(close_async_clients(), _sync_loop).result(timeout=5)
+    except Exception:
+        pass
 
 # --- The Reusable Score Calculation Function ---
-def get_wallet_risk_score(wallet_address: str):
+async def get_wallet_risk_score_async(wallet_address: str, platform_history: tuple = None):
     """
-    Calculates a risk score for a given wallet.
+    Async version of get_wallet_risk_score().
+    The balance, txlist and tokentx lookups run in parallel over pooled
+    connections, so latency is roughly that of the slowest single call.
+    Pass `platform_history` as (good_loans, defaulted_loans) when it was
+    already fetched in bulk (see platform_history.get_repayment_histories).
     Returns a dictionary with all score data.
     Raises an Exception on ANY failure.
     """
-    if not w3 or not w3.is_connected() or not ETH_RPC_ENDPOINT:
-        raise Exception("Web3 provider not connected. Check your ETH_RPC_ENDPOINT.")
-        
+    from eth_utils import is_address, to_checksum_address
+
+    await _ensure_provider_healthy()
+
     if not ETHERSCAN_API_KEY:
         raise Exception("ETHERSCAN_API_KEY is missing from .env file.")
 
-    if not w3.is_address(wallet_address):
+    if not is_address(wallet_address):
         raise Exception("Invalid Ethereum address format.")
-        
-    checksum_address = w3.to_checksum_address(wallet_address)
-    
-    score = 0
-    analysis = {}
 
+    checksum_address = to_checksum_address(wallet_address)
+
+    # Concurrent requests for the same wallet (and inputs) share one computation
+    if platform_history is not None:
+        platform_history = tuple(platform_history)
+    return await _single_flight(
+        ("score", checksum_address, platform_history),
+        lambda: _compute_wallet_risk_score(checksum_address, platform_history),
+    )
+
+async def _compute_wallet_risk_score(checksum_address: str, platform_history: tuple = None):
+    """Fetches every input for a validated wallet and scores it."""
     # Use a try/except block for all external API calls
     try:
         # --- 1. Platform-Specific History ---
-        good_loans, defaulted_loans = get_platform_repayment_history(checksum_address)
-        score += good_loans * WEIGHTS["platform_repayment_good"]
-        score += defaulted_loans * WEIGHTS["platform_repayment_bad"]
-        analysis["platform_good_loans"] = good_loans
-        analysis["platform_defaulted_loans"] = defaulted_loans
-
-        # --- 2. ETH Balance ---
-        balance_wei = w3.eth.get_balance(checksum_address)
-        eth_balance = w3.from_wei(balance_wei, 'ether')
-        balance_score = min(float(eth_balance) * WEIGHTS["eth_balance"], 200) 
-        score += balance_score
-        analysis["eth_balance"] = float(eth_balance)
-        analysis["balance_score"] = balance_score
-
-        # --- 3. Wallet Age & Tx Count ---
-        tx_params = {"module": "account", "action": "txlist", "address": checksum_address, "startblock": 0, "endblock": 99999999, "sort": "asc", "apikey": ETHERSCAN_API_KEY}
-        response = requests.get(ETHERSCAN_API_URL, params=tx_params)
-        tx_data = response.json()
-
-        # Robust check using .get()
-        if tx_data.get("status") == "1" and tx_data.get("result"):
-            tx_list = tx_data["result"]
-            tx_count = len(tx_list)
-            first_tx_timestamp = int(tx_list[0]['timeStamp'])
-            first_tx_time = datetime.fromtimestamp(first_tx_timestamp, timezone.utc)
-            wallet_age_days = (datetime.now(timezone.utc) - first_tx_time).days
-            age_score = wallet_age_days * WEIGHTS["wallet_age_days"]
-            tx_score = tx_count * WEIGHTS["tx_count"]
-            score += age_score + tx_score
-            analysis.update({"wallet_age_days": wallet_age_days, "age_score": age_score, "transaction_count": tx_count, "tx_score": tx_score})
-        else:
-            analysis.update({"wallet_age_days": 0, "transaction_count": 0, "note": "New wallet with no transaction history."})
-
-        # --- 4. ERC-20 Token Holdings ---
-        token_params = {"module": "account", "action": "tokentx", "address": checksum_address, "startblock": 0, "endblock": 99999999, "sort": "asc", "apikey": ETHERSCAN_API_KEY}
-        token_response = requests.get(ETHERSCAN_API_URL, params=token_params)
-        token_data = token_response.json()
-        
-        unique_tokens = set()
-        if token_data.get("status") == "1" and token_data.get("result"):
-            for tx in token_data["result"]:
-                unique_tokens.add(tx['tokenSymbol'])
-        
-        erc20_token_count = len(unique_tokens)
-        token_score = erc20_token_count * WEIGHTS["erc20_token_count"]
-        score += token_score
-        analysis.update({"erc20_token_variety_count": erc20_token_count, "token_score": token_score})
+        if platform_history is None:
+            with metrics.span("platform_history"):
+                platform_history = await asyncio.to_thread(get_platform_repayment_history, checksum_address)
+        good_loans, defaulted_loans = platform_history
+
+        # --- 2-4. Fire all upstream calls at once (cached inputs skip the network) ---
+        with metrics.span("fetch_features"):
+            eth_balance, tx_summary, tokens = await asyncio.gather(
+                _cached_feature(checksum_address, "balance", _fetch_balance),
+                _cached_feature(checksum_address, "tx_summary", _fetch_tx_summary),
+                _cached_feature(checksum_address, "token_set", _fetch_token_set),
+            )
 
     except Exception as e:
         # If any API call fails, raise a new exception
-        raise Exception(f"Failed during API call: {e}")
+        raise Exception(f"Failed during API call: {e}") from e
 
-    # --- Final Score ---
-    # MOVED this code to be *before* the final return
-    final_score = round(max(300, min(850, 300 + score)))
-    risk_level = "low" if final_score > 700 else "medium" if final_score > 550 else "high"
+    # --- Wallet Age ---
+    wallet_age_days = 0
+    if tx_summary["tx_count"] > 0:
+        first_tx_time = datetime.fromtimestamp(tx_summary["first_tx_timestamp"], timezone.utc)
+        wallet_age_days = (datetime.now(timezone.utc) - first_tx_time).days
+
+    analysis = {
+        "platform_good_loans": good_loans,
+        "platform_defaulted_loans": defaulted_loans,
+        "eth_balance": eth_balance,
+        "wallet_age_days": wallet_age_days,
+        "transaction_count": tx_summary["tx_count"],
+        "erc20_token_variety_count": len(tokens),
+        "first_tx_timestamp": tx_summary["first_tx_timestamp"],
+    }
+    with metrics.span("score_kernel"):
+        return score_analysis(checksum_address, analysis)
+
+def score_analysis(checksum_address: str, analysis: dict, weights: dict = None):
+    """
+    Turns a wallet's raw features into the full score dictionary.
+    Pure (no I/O); uses the same vectorised kernel as bulk re-scoring, so
+    both paths give identical results.
+
+    Args:
+        checksum_address (str): The wallet the features belong to.
+        analysis (dict): Raw features, keyed by scoring_kernel.FEATURE_NAMES.
+        weights (dict): Score weights; defaults to WEIGHTS.
+
+    Returns:
+        (dict): Same shape as get_wallet_risk_score().
+    """
+    components = score_components(build_feature_matrix([analysis]), weights)
+    final_scores, risk_levels = finalize_scores(components["raw_score"])
+
+    analysis = dict(analysis)
+    analysis["balance_score"] = float(components["balance_score"][0])
+    if analysis["transaction_count"] > 0:
+        analysis["age_score"] = float(components["age_score"][0])
+        analysis["tx_score"] = float(components["tx_score"][0])
+    else:
+        analysis["note"] = "New wallet with no transaction history."
+    analysis["token_score"] = float(components["token_score"][0])
 
     return {
         "wallet_address": checksum_address,
-        "score": final_score,
-        "risk_level": risk_level,
+        "score": int(final_scores[0]),
+        "risk_level": str(risk_levels[0]),
         "last_updated": datetime.now(timezone.utc).isoformat(),
         "analysis_breakdown": analysis
-    }
\ No newline at end of file
+    }
+
+def get_wallet_risk_score(wallet_address: str, platform_history: tuple = None):
+    """
+    Calculates a risk score for a given wallet.
+    Thin blocking wrapper around get_wallet_risk_score_async(); safe to call
+    from any thread, all callers share the same connection pools.
+    Returns a dictionary with all score data.
+    Raises an Exception on ANY failure.
+    """
+    future = asyncio.run_coroutine_threadsafe(get_wallet_risk_score_async(wallet_address, platform_history), _get_sync_loop())
+    return future.result()
@@ -1,21 +1,26 @@
 # seed.py
 
 import os
-from supabase import create_client, Client
+import argparse
 from dotenv import load_dotenv
 from datetime import datetime, timezone, timedelta
 import uuid
 
 # --- Configuration ---
-load_dotenv()
-url = os.environ.get("SUPABASE_URL")
-key = os.environ.get("SUPABASE_SERVICE_KEY")
+def connect_supabase():
+    """Creates the Supabase client from .env (raises if the credentials are missing)."""
+    from supabase import create_client, Client
 
-if not url or not key:
-    raise Exception("Supabase credentials not found in .env file")
+    load_dotenv()
+    url = os.environ.get("SUPABASE_URL")
+    key = os.environ.get("SUPABASE_SERVICE_KEY")
 
-supabase: Client = create_client(url, key)
-print("Connected to Supabase.")
+    if not url or not key:
+        raise Exception("Supabase credentials not found in .env file")
+
+    supabase: Client = create_client(url, key)
+    print("Connected to Supabase.")
+    return supabase
 
 # --- 1. MOCK USERS (No changes) ---
 users_data = [
@@ -76,7 +81,7 @@ loans_data = [
 ]
 
 
-def clear_tables():
+def clear_tables(supabase):
     """Deletes data in reverse order to respect foreign keys."""
     print("--- CLEARING ALL TABLES ---")
     try:
@@ -95,7 +100,7 @@ def clear_tables():
         print("Continuing with seeding...")
 
 
-def seed_data():
+def seed_data(supabase):
     """Inserts or updates data using upsert."""
     print("\n--- SEEDING DATABASE (Upserting) ---")
     try:
@@ -157,10 +162,42 @@ def seed_data():
             print(f"Code: {e.code}")
 
 
-if __name__ == "__main__":
-    # This will wipe all data and replace it with the mock data using upsert
+def seed_synthetic_data(args):
+    """Streams a synthetic dataset of the requested size to Supabase or SQLite."""
+    from synthetic_data import SyntheticDataset, SupabaseSink, SQLiteSink, seed_synthetic
+
+    as_of = datetime.fromisoformat(args.as_of).replace(tzinfo=timezone.utc) if args.as_of else None
+    dataset = SyntheticDataset(args.users, args.requests, args.offers, args.loans, args.seed, as_of)
+    sink = SQLiteSink(args.sqlite) if args.sqlite else SupabaseSink(connect_supabase())
+    print(f"\n--- SEEDING SYNTHETIC DATA (seed = {dataset.seed}, as of {dataset.as_of.date()}) ---")
     try:
-        clear_tables()
-        seed_data()
-    except Exception as e:
-        print(f"Seeding script failed: {e}")
\ No newline at end of file
+        seed_synthetic(sink, dataset, args.chunk_size, clear=not args.no_clear)
+        print("\n--- SEEDING COMPLETE ---")
+    finally:
+        sink.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Seed the database with the demo data, or with synthetic data for load testing.")
+    parser.add_argument("--synthetic", action="store_true", help="Generate synthetic rows instead of the 10-user demo data.")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--offers", type=int, default=20000)
+    parser.add_argument("--loans", type=int, default=50000)
+    parser.add_argument("--seed", type=int, default=0, help="Same seed (and --as-of) -> same rows.")
+    parser.add_argument("--as-of", help="Date the synthetic loans are relative to (YYYY-MM-DD, default today).")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Rows per bulk insert.")
+    parser.add_argument("--sqlite", help="Write to this SQLite file instead of Supabase.")
+    parser.add_argument("--no-clear", action="store_true", help="Keep existing rows (synthetic mode).")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        seed_synthetic_data(args)
+    else:
+        # This will wipe all data and replace it with the mock data using upsert
+        try:
+            supabase = connect_supabase()
+            clear_tables(supabase)
+            seed_data(supabase)
+        except Exception as e:
+            print(f"Seeding script failed: {e}")
@@ -0,0 +1,29 @@
+-- update_user_scores.sql
+--
+-- Bulk score update used by ScoreWriter (update_scores.build_score_writer).
+-- Takes a JSON array of {wallet_id, risk_score, risk_level, last_updated,
+-- score_features} rows, updates the matching users in one statement and
+-- returns the wallets it updated. Wallets with no user are skipped, never
+-- inserted. Rows without score_features (offline re-scores) keep the
+-- features already stored.
+--
+-- Apply once, e.g. in the Supabase SQL editor.
+
+alter table users add column if not exists score_features jsonb;
+
+create or replace function update_user_scores(score_rows jsonb)
+returns table (wallet_id text)
+language sql
+as $$
+  update users as u
+  set risk_score = r.risk_score,
+      risk_level = r.risk_level,
+      last_updated = r.last_updated,
+      score_features = coalesce(r.score_features, u.score_features)
+  from jsonb_to_recordset(score_rows)
+    as r(wallet_id text, risk_score integer, risk_level text, last_updated timestamptz, score_features jsonb)
+  where u.wallet_id = r.wallet_id
+  returning u.wallet_id;
+$$;
+
+revoke execute on function update_user_scores(jsonb) from public, anon, authenticated;
@@ -0,0 +1,72 @@
+# supabase_queries.py
+#
+# Read helpers shared by the batch jobs: keyset paging over any table and the
+# bulk risk-score lookup.
+
+import metrics
+
+# --- Query Config ---
+# Rows per page (PostgREST caps a single response, 1000 rows by default) and
+# IDs per IN (...) filter (keeps the request URL short)
+PAGE_SIZE = 1000
+ID_CHUNK_SIZE = 100
+USERS_TABLE = "users"
+
+
+def iter_pages(client, table: str, columns: str, key: str = "id", where=None, after_key=None, page_size: int = PAGE_SIZE):
+    """
+    Pages through a table by keyset (key > last key seen), which stays fast
+    at any depth, unlike OFFSET paging.
+
+    Args:
+        client: Supabase client.
+        table (str): Table to read.
+        columns (str): Columns to select; must include `key`.
+        key (str): Unique, sortable column to page on.
+        where (callable): Optional; where(query) adds filters to every page.
+        after_key: Resume after this key.
+        page_size (int): Rows per request.
+
+    Yields:
+        (list): The next page of rows, in ascending key order.
+    """
+    while True:
+        query = client.table(table).select(columns)
+        if where is not None:
+            query = where(query)
+        if after_key is not None:
+            query = query.gt(key, after_key)
+        metrics.incr("db_calls_total", table=table, action="select")
+        with metrics.span("db_select", table=table):
+            rows = query.order(key).limit(page_size).execute().data or []
+        if rows:
+            yield rows
+        # NULL keys sort last, so a page ending on one ends the table too
+        if len(rows) < page_size or rows[-1].get(key) is None:
+            return
+        after_key = rows[-1][key]
+
+
+def iter_rows(client, table: str, columns: str, **kwargs):
+    """Like iter_pages(), but yields one row at a time."""
+    for rows in iter_pages(client, table, columns, **kwargs):
+        yield from rows
+
+
+def load_risk_scores(client, user_ids, chunk_size: int = ID_CHUNK_SIZE):
+    """
+    Looks up the stored risk scores of many users, one IN (...) query per chunk.
+
+    Returns:
+        (dict): {user id: risk_score} for the users that have a score.
+    """
+    user_ids = list(user_ids)
+    scores = {}
+    for start in range(0, len(user_ids), chunk_size):
+        chunk = user_ids[start:start + chunk_size]
+        metrics.incr("db_calls_total", table=USERS_TABLE, action="select")
+        response = client.table(USERS_TABLE).select("id,risk_score").in_("id", chunk).execute()
+        for row in response.data or []:
+            if row.get("risk_score") is not None:
+                scores[row["id"]] = row["risk_score"]
+    return scores
@@ -0,0 +1,298 @@
+# synthetic_data.py
+#
+# Streaming synthetic data for load-testing scoring, matching and analytics.
+# Every table is a generator, so seeding a million rows holds one chunk in
+# memory at a time. Foreign keys are consistent without remembering any
+# rows: user i always has the same wallet ID and risk score, derived from
+# the seed, so loan outcomes can follow the borrower's score.
+
+import time
+import uuid
+import random
+import hashlib
+import sqlite3
+from datetime import datetime, timezone, timedelta
+from loan_calculator import get_max_loan_amount
+from scoring_kernel import LOW_RISK_ABOVE, MEDIUM_RISK_ABOVE
+
+# --- Distribution Config ---
+LENDER_FRACTION = 0.2
+REQUEST_AMOUNTS = (100, 200, 250, 500, 800, 1000, 1500, 2500, 5000)
+REQUEST_AMOUNT_WEIGHTS = (8, 10, 12, 20, 10, 18, 10, 8, 4)
+OFFER_AMOUNTS = (200, 500, 1000, 2000, 5000, 10000)
+OFFER_AMOUNT_WEIGHTS = (10, 25, 30, 20, 10, 5)
+DURATIONS_DAYS = (7, 10, 14, 30, 45, 60, 90)
+DURATION_WEIGHTS = (10, 5, 20, 35, 10, 12, 8)
+# Of the loans whose due date has passed: repaid, defaulted, still active
+# (overdue), weighted by the borrower's risk tier so scores predict defaults.
+# Over the default score spread this averages about 85/7/8.
+PAST_DUE_OUTCOMES = ("closed", "defaulted", "active")
+PAST_DUE_OUTCOME_WEIGHTS_BY_TIER = {
+    "low": (95, 2, 3),
+    "medium": (88, 5, 7),
+    "high": (72, 14, 14),
+}
+LOAN_HISTORY_DAYS = 365
+
+DEFAULT_CHUNK_SIZE = 1000
+TABLE_ORDER = ("users", "loan_requests", "loan_offers", "loans")
+
+
+def wallet_id(seed: int, index: int):
+    """The (deterministic) wallet address of synthetic user `index`."""
+    return "0x" + hashlib.sha1(f"{seed}:user:{index}".encode()).hexdigest()
+
+
+def risk_score(seed: int, index: int):
+    """The (deterministic) risk score of synthetic user `index`."""
+    rng = random.Random(f"{seed}:score:{index}")
+    return int(min(850, max(300, rng.gauss(610, 90))))
+
+
+def risk_tier(score: int):
+    """The scoring risk level ("low", "medium" or "high") of a score."""
+    if score > LOW_RISK_ABOVE:
+        return "low"
+    return "medium" if score > MEDIUM_RISK_ABOVE else "high"
+
+
+def _rng(seed: int, table: str):
+    # One stream per table, so changing one table's size does not reshuffle the others
+    return random.Random(f"{seed}:{table}")
+
+
+def _uuid(rng: random.Random):
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+class SyntheticDataset:
+    """
+    Row generators for users, loan_requests, loan_offers and loans, shaped
+    like the Supabase tables seed.py fills.
+
+    The first LENDER_FRACTION of users are lenders, the rest borrowers;
+    requests and loans reference random borrowers, offers and loans random
+    lenders.
+
+    Args:
+        users (int): Number of users.
+        requests (int): Number of loan requests.
+        offers (int): Number of loan offers.
+        loans (int): Number of loans.
+        seed (int): Same seed (and as_of) -> the same rows.
+        as_of (datetime): "Now" for the generated dates.
+    """
+    def __init__(self, users: int, requests: int, offers: int, loans: int, seed: int = 0, as_of: datetime = None):
+        self.users = max(2, users)
+        self.requests = requests
+        self.offers = offers
+        self.loans = loans
+        self.seed = seed
+        self.as_of = as_of or datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+        self.lenders = max(1, int(self.users * LENDER_FRACTION))
+
+    def _lender(self, rng: random.Random):
+        return wallet_id(self.seed, rng.randrange(self.lenders))
+
+    def _borrower_index(self, rng: random.Random):
+        return rng.randrange(self.lenders, self.users)
+
+    def _borrower(self, rng: random.Random):
+        return wallet_id(self.seed, self._borrower_index(rng))
+
+    def counts(self):
+        return {"users": self.users, "loan_requests": self.requests, "loan_offers": self.offers, "loans": self.loans}
+
+    def rows(self, table: str):
+        return {
+            "users": self.user_rows,
+            "loan_requests": self.request_rows,
+            "loan_offers": self.offer_rows,
+            "loans": self.loan_rows,
+        }[table]()
+
+    def user_rows(self):
+        rng = _rng(self.seed, "users")
+        for i in range(self.users):
+            wallet = wallet_id(self.seed, i)
+            role = "lender" if i < self.lenders else "borrower"
+            score = risk_score(self.seed, i)
+            yield {
+                "id": wallet,
+                "name": f"Synthetic {role.title()} {i}",
+                "username": f"{role}_{i}",
+                "pfp": "images/pfp/default.png",
+                "wallet": wallet,
+                "onboarded": rng.random() < 0.9,
+                "risk_score": score,
+                "max_loan": get_max_loan_amount({"score": score}),
+            }
+
+    def request_rows(self):
+        rng = _rng(self.seed, "loan_requests")
+        for _ in range(self.requests):
+            yield {
+                "id": _uuid(rng),
+                "borrower_id": self._borrower(rng),
+                "amount": rng.choices(REQUEST_AMOUNTS, REQUEST_AMOUNT_WEIGHTS)[0],
+                "repayment_duration_days": rng.choices(DURATIONS_DAYS, DURATION_WEIGHTS)[0],
+                "status": "active" if rng.random() < 0.3 else "closed",
+            }
+
+    def offer_rows(self):
+        rng = _rng(self.seed, "loan_offers")
+        for _ in range(self.offers):
+            yield {
+                "id": _uuid(rng),
+                "lender_id": self._lender(rng),
+                "amount": rng.choices(OFFER_AMOUNTS, OFFER_AMOUNT_WEIGHTS)[0],
+                # Most lenders ask 4-9%, a few go up to 15%
+                "interest_rate": round(rng.triangular(3, 15, 6) * 4) / 4,
+                "repayment_duration": rng.choices(DURATIONS_DAYS, DURATION_WEIGHTS)[0],
+                "status": "active" if rng.random() < 0.4 else "accept",
+            }
+
+    def loan_rows(self):
+        rng = _rng(self.seed, "loans")
+        for _ in range(self.loans):
+            principal = rng.choices(REQUEST_AMOUNTS, REQUEST_AMOUNT_WEIGHTS)[0]
+            interest_rate = round(rng.triangular(3, 15, 6) * 4) / 4
+            duration_days = rng.choices(DURATIONS_DAYS, DURATION_WEIGHTS)[0]
+            start = self.as_of - timedelta(seconds=rng.randrange(LOAN_HISTORY_DAYS * 86400))
+            due = start + timedelta(days=duration_days)
+            borrower = self._borrower_index(rng)
+            if due > self.as_of:
+                status = "active"
+            else:
+                weights = PAST_DUE_OUTCOME_WEIGHTS_BY_TIER[risk_tier(risk_score(self.seed, borrower))]
+                status = rng.choices(PAST_DUE_OUTCOMES, weights)[0]
+            yield {
+                "id": _uuid(rng),
+                "lender_id": self._lender(rng),
+                "borrower_id": wallet_id(self.seed, borrower),
+                "principal_amount": principal,
+                "interest_rate": interest_rate,
+                "total_repayment_amount": round(principal * (1 + interest_rate / 100), 2),
+                "repayment_duration_days": duration_days,
+                "start_date": start.isoformat(),
+                "due_date": due.isoformat(),
+                "status": status,
+            }
+
+
+def chunked(rows, size: int = DEFAULT_CHUNK_SIZE):
+    """Groups a row stream into lists of at most `size` rows."""
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# --- Sinks ---
+class SupabaseSink:
+    """
+    Writes chunks with one bulk upsert each (re-running with the same seed
+    overwrites instead of duplicating). A failed chunk is retried with backoff.
+
+    Args:
+        client: Supabase client.
+        max_retries (int): Attempts per chunk.
+        retry_backoff (float): Seconds before the first retry; doubles each time.
+    """
+    def __init__(self, client, max_retries: int = 3, retry_backoff: float = 1.0):
+        self.client = client
+        self.max_retries = max(1, max_retries)
+        self.retry_backoff = retry_backoff
+
+    def write(self, table: str, rows: list):
+        for attempt in range(self.max_retries):
+            try:
+                self.client.table(table).upsert(rows).execute()
+                return
+            except Exception as e:
+                if attempt + 1 >= self.max_retries:
+                    raise
+                print(f"WARNING: Upsert of {len(rows)} rows into {table} failed (attempt {attempt + 1}/{self.max_retries}). Error: {e}")
+                time.sleep(self.retry_backoff * (2 ** attempt))
+
+    def clear(self, table: str):
+        # Every seeded table has a status column except users
+        column, value = ("username", "non-existent-username") if table == "users" else ("status", "non-existent-status")
+        self.client.table(table).delete().neq(column, value).execute()
+
+    def close(self):
+        pass
+
+
+class SQLiteSink:
+    """
+    Local stand-in for the Supabase tables: each table is created from the
+    first chunk's columns and filled with executemany, one commit per chunk.
+
+    Args:
+        path (str): SQLite file.
+    """
+    _TYPES = {bool: "INTEGER", int: "INTEGER", float: "REAL"}
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._columns = {}
+
+    def _ensure_table(self, table: str, row: dict):
+        if table in self._columns:
+            return
+        columns = list(row)
+        definitions = ", ".join(
+            f"{name} {self._TYPES.get(type(row[name]), 'TEXT')}" + (" PRIMARY KEY" if name == "id" else "")
+            for name in columns
+        )
+        self._conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({definitions})")
+        self._columns[table] = columns
+
+    def write(self, table: str, rows: list):
+        self._ensure_table(table, rows[0])
+        columns = self._columns[table]
+        placeholders = ", ".join("?" * len(columns))
+        with self._conn:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) VALUES ({placeholders})",
+                ([row.get(name) for name in columns] for row in rows),
+            )
+
+    def clear(self, table: str):
+        with self._conn:
+            self._conn.execute(f"DROP TABLE IF EXISTS {table}")
+        self._columns.pop(table, None)
+
+    def close(self):
+        self._conn.close()
+
+
+def seed_synthetic(sink, dataset: SyntheticDataset, chunk_size: int = DEFAULT_CHUNK_SIZE, clear: bool = True):
+    """
+    Streams every table of `dataset` into `sink` in parent-first order.
+
+    Returns:
+        (dict): Rows written per table.
+    """
+    if clear:
+        # Children first, so foreign keys never dangle
+        for table in reversed(TABLE_ORDER):
+            sink.clear(table)
+
+    written = {}
+    for table in TABLE_ORDER:
+        started = time.perf_counter()
+        written[table] = 0
+        for chunk in chunked(dataset.rows(table), chunk_size):
+            sink.write(table, chunk)
+            written[table] += len(chunk)
+        elapsed = time.perf_counter() - started
+        print(f"Seeded {written[table]} {table} in {elapsed:.1f}s ({written[table] / elapsed if elapsed else 0:.0f} rows/s).")
+    return written
@@ -1,21 +1,44 @@
 # update_scores.py
 
 import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from supabase import create_client, Client
 from dotenv import load_dotenv
 from datetime import datetime, timezone
 # --- FIX: Correctly import the logic function ---
 from scoring_logic import get_wallet_risk_score
+import scoring_logic
+from scoring_kernel import feature_record
+from score_writer import ScoreWriter
+import platform_history
+import metrics
 
 # ---!!!!!! TEST MODE TOGGLE !!!!!! ---
 TEST_MODE = True
 # --------------------------------------
 
+# --- Batch Concurrency Config ---
+# Number of wallets scored in parallel. Upstream calls are still throttled by
+# the per-provider rate limiters in scoring_logic, so raising this only helps
+# until the Etherscan / RPC quota is saturated.
+MAX_WORKERS = int(os.getenv("SCORE_WORKERS", 8))
+
+# --- Score Write-Behind Config ---
+# Scores are buffered and written as bulk updates of up to WRITE_BATCH_SIZE
+# rows, or after WRITE_FLUSH_SECONDS, whichever comes first.
+WRITE_BATCH_SIZE = int(os.getenv("SCORE_WRITE_BATCH_SIZE", 500))
+WRITE_FLUSH_SECONDS = float(os.getenv("SCORE_WRITE_FLUSH_SECONDS", 2.0))
+
 # --- Supabase Table Config ---
 USER_TABLE = "users"
 WALLET_COLUMN = "wallet_id"
 SCORE_COLUMN = "risk_score"
 RISK_LEVEL_COLUMN = "risk_level"
+# jsonb: the inputs of the last score, for offline re-scoring (score_job.py --from-stored-features)
+FEATURES_COLUMN = "score_features"
+# Postgres function that updates the score columns of existing users in bulk
+# (see sql/update_user_scores.sql; it must be created in the database once)
+SCORE_UPDATE_FUNCTION = "update_user_scores"
 
 # ---!!!!!! MOCK DATA AND CLASSES (Unchanged) !!!!!! ---
 MOCK_USER_DATA = [
@@ -24,14 +47,40 @@ MOCK_USER_DATA = [
     {WALLET_COLUMN: "0x123456...InvalidAddress"}, # A fake address to test errors
 ]
 
+MOCK_LOAN_DATA = [
+    {"id": "mock-loan-1", "borrower_id": "0xd8da6bf26964af9d7eed9e03e53415d37aa96045", "status": "closed", "due_date": "2024-01-01T00:00:00+00:00", "created_at": "2023-12-01T00:00:00+00:00"},
+]
+
 class MockSupabaseQuery:
     def __init__(self, data):
         self.data = data
+        self.negate = False
     def select(self, columns):
         print(f"[Mock] Selecting '{columns}'...")
         return self
+    @property
+    def not_(self):
+        self.negate = True
+        return self
+    def in_(self, column, values):
+        values = set(values)
+        self.data = [row for row in self.data if (row.get(column) in values) != self.negate]
+        self.negate = False
+        return self
+    def gt(self, column, value):
+        self.data = [row for row in self.data if row.get(column) > value]
+        return self
+    def order(self, column):
+        self.data = sorted(self.data, key=lambda row: row.get(column))
+        return self
+    def limit(self, count):
+        self.data = self.data[:count]
+        return self
+    def range(self, start, end):
+        self.data = self.data[start:end + 1]
+        return self
     def execute(self):
-        print("[Mock] Returning mock user list.")
+        print(f"[Mock] Returning {len(self.data)} mock rows.")
         class MockResponse:
             def __init__(self, data):
                 self.data = data
@@ -58,35 +107,130 @@ class MockSupabaseClient:
     def table(self, table_name):
         if table_name == USER_TABLE:
             return MockSupabaseQuery(MOCK_USER_DATA)
+        if table_name == platform_history.LOANS_TABLE:
+            return MockSupabaseQuery(MOCK_LOAN_DATA)
         return MockSupabaseTable(table_name)
     
     def table_for_update(self, table_name):
         return MockSupabaseTable(table_name)
+
+    def rpc(self, function_name, params):
+        # Like the real function, only rows for existing users come back as updated
+        print(f"[Mock] Calling {function_name}() with {len(params['score_rows'])} rows")
+        known = {row[WALLET_COLUMN] for row in MOCK_USER_DATA}
+        return MockSupabaseQuery([{WALLET_COLUMN: row[WALLET_COLUMN]} for row in params["score_rows"] if row[WALLET_COLUMN] in known])
 # ---!!!!!! END OF MOCK DATA !!!!!! ---
 
 
-def update_all_user_scores():
-    print(f"Starting batch score update (TEST_MODE = {TEST_MODE})...")
-    supabase = None
-    
+def score_wallet(wallet_id: str, repayment_history: tuple = None):
+    """
+    Scores a single wallet and builds its update row.
+    Runs inside a worker thread; raises on any failure.
+    """
+    print(f"--- Processing: {wallet_id} ---")
+    with metrics.span("score_wallet"):
+        score_data = get_wallet_risk_score(wallet_id, repayment_history)
+
+    # 5. Create the update payload
+    return {
+        WALLET_COLUMN: wallet_id,
+        SCORE_COLUMN: score_data["score"],
+        RISK_LEVEL_COLUMN: score_data["risk_level"],
+        "last_updated": score_data["last_updated"],
+        FEATURES_COLUMN: feature_record(score_data["analysis_breakdown"]),
+    }
+
+
+def connect_supabase():
+    """
+    Returns the Supabase client for this run (the mock one in TEST_MODE),
+    or None if it could not be created.
+    """
     if TEST_MODE:
-        supabase = MockSupabaseClient()
         print("Using Mock Supabase Client.")
-    else:
-        # --- Use Real Supabase Client ---
-        load_dotenv()
-        url = os.environ.get("SUPABASE_URL")
-        key = os.environ.get("SUPABASE_SERVICE_KEY")
-        
-        if not url or not key:
-            print("ERROR: SUPABASE_URL and SUPABASE_SERVICE_KEY not found in .env")
-            return
+        return MockSupabaseClient()
+
+    # --- Use Real Supabase Client ---
+    load_dotenv()
+    url = os.environ.get("SUPABASE_URL")
+    key = os.environ.get("SUPABASE_SERVICE_KEY")
+
+    if not url or not key:
+        print("ERROR: SUPABASE_URL and SUPABASE_SERVICE_KEY not found in .env")
+        return None
+    try:
+        supabase: Client = create_client(url, key)
+        print("Successfully connected to REAL Supabase.")
+        return supabase
+    except Exception as e:
+        print(f"ERROR: Could not connect to Supabase. {e}")
+        return None
+
+
+def build_score_writer(supabase, batch_size: int = WRITE_BATCH_SIZE, flush_interval: float = WRITE_FLUSH_SECONDS):
+    """
+    Returns a ScoreWriter that bulk-updates the score columns of existing
+    users through SCORE_UPDATE_FUNCTION. This is an UPDATE, not an upsert:
+    score rows lack the columns a new user needs, and a wallet deleted
+    mid-run should be reported, not re-created.
+    """
+    def write_rows(rows: list):
+        response = supabase.rpc(SCORE_UPDATE_FUNCTION, {"score_rows": rows}).execute()
+        return [row[WALLET_COLUMN] for row in response.data or []]
+
+    return ScoreWriter(write_rows, WALLET_COLUMN, batch_size=batch_size, flush_interval=flush_interval)
+
+
+def score_wallets(executor, writer: ScoreWriter, wallet_ids: list, repayment_histories: dict, scored_ids: list = None,
+                  failures: dict = None):
+    """
+    Scores wallets on the executor and queues each result on the writer.
+    If `scored_ids` is given, the ID of every wallet that scored is appended to it.
+    If `failures` is given, every wallet that could not be scored is mapped to its exception.
+
+    Returns:
+        (int): How many wallets could not be scored.
+    """
+    failed_count = 0
+    futures = {executor.submit(score_wallet, wallet_id, repayment_histories.get(wallet_id)): wallet_id for wallet_id in wallet_ids}
+
+    for future in as_completed(futures):
+        wallet_id = futures[future]
         try:
-            supabase: Client = create_client(url, key)
-            print("Successfully connected to REAL Supabase.")
+            update_payload = future.result()
+            writer.add(update_payload)
+            if scored_ids is not None:
+                scored_ids.append(wallet_id)
+            metrics.incr("wallets_scored_total", outcome="ok")
+            print(f"SCORED: {wallet_id} -> {update_payload[SCORE_COLUMN]} ({update_payload[RISK_LEVEL_COLUMN]})")
+
         except Exception as e:
-            print(f"ERROR: Could not connect to Supabase. {e}")
-            return
+            # --- This block will now catch all errors from get_wallet_risk_score ---
+            print(f"FAILED: Could not update {wallet_id}. Error: {e}")
+            metrics.incr("wallets_scored_total", outcome="failed")
+            if failures is not None:
+                failures[wallet_id] = e
+            failed_count += 1
+
+    return failed_count
+
+
+def print_cache_stats():
+    """Prints how many upstream fetches the feature cache saved this run."""
+    if scoring_logic.feature_cache is None:
+        return
+    stats = scoring_logic.feature_cache.stats()
+    print(f"Feature cache:        {stats['hits']} hits (upstream fetches saved), "
+          f"{stats['misses']} misses, {stats['hit_rate']:.0%} hit rate")
+
+
+def update_all_user_scores(max_workers: int = MAX_WORKERS, write_batch_size: int = WRITE_BATCH_SIZE,
+                           write_flush_seconds: float = WRITE_FLUSH_SECONDS):
+    print(f"Starting batch score update (TEST_MODE = {TEST_MODE}, workers = {max_workers})...")
+
+    supabase = connect_supabase()
+    if supabase is None:
+        return
 
     # 2. Fetch all users
     try:
@@ -100,46 +244,30 @@ def update_all_user_scores():
         print(f"ERROR: Could not fetch users. Check table/column names. {e}")
         return
 
-    # 3. Loop, Calculate, and Update
-    updated_count = 0
-    failed_count = 0
-    
-    for user in users:
-        wallet_id = user.get(WALLET_COLUMN)
-        if not wallet_id:
-            continue
-            
-        print(f"--- Processing: {wallet_id} ---")
-        
-        try:
-            # --- FIX: Call the correct function ---
-            score_data = get_wallet_risk_score(wallet_id)
-            
-            # 5. Create the update payload
-            update_payload = {
-                SCORE_COLUMN: score_data["score"],
-                RISK_LEVEL_COLUMN: score_data["risk_level"],
-                "last_updated": score_data["last_updated"]
-            }
-            
-            # 6. Update the user's row in Supabase
-            if TEST_MODE:
-                supabase.table_for_update(USER_TABLE).update(update_payload).eq(WALLET_COLUMN, wallet_id).execute()
-            else:
-                supabase.table(USER_TABLE).update(update_payload).eq(WALLET_COLUMN, wallet_id).execute()
-            
-            print(f"SUCCESS: Updated {wallet_id} to score {score_data['score']} ({score_data['risk_level']})")
-            updated_count += 1
-            
-        except Exception as e:
-            # --- This block will now catch all errors from get_wallet_risk_score ---
-            print(f"FAILED: Could not update {wallet_id}. Error: {e}")
-            failed_count += 1
+    wallet_ids = [user.get(WALLET_COLUMN) for user in users if user.get(WALLET_COLUMN)]
+
+    # 3. Load every user's platform repayment history in a few bulk queries
+    platform_history.set_client(supabase)
+    try:
+        repayment_histories = platform_history.get_repayment_histories(wallet_ids)
+    except Exception as e:
+        print(f"ERROR: Could not load platform repayment history. {e}")
+        return
+
+    # 4. Calculate scores concurrently; rows are written behind by a buffered writer
+    writer = build_score_writer(supabase, write_batch_size, write_flush_seconds)
+    with metrics.span("batch_run"), writer, ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        failed_count = score_wallets(executor, writer, wallet_ids, repayment_histories)
+
+    updated_count = writer.written
+    failed_count += len(writer.failed)
 
     print("\n--- Batch Complete ---")
     print(f"Successfully updated: {updated_count}")
     print(f"Failed to update:     {failed_count}")
+    print_cache_stats()
 
 
 if __name__ == "__main__":
-    update_all_user_scores()
\ No newline at end of file
+    metrics.configure()
+    update_all_user_scores()
@@ -0,0 +1,141 @@
+# wallet_history.py
+
+import json
+import sqlite3
+import threading
+
+
+def empty_history():
+    """The aggregates for a wallet that has never been synced."""
+    return {
+        "tx_last_block": -1,
+        "tx_count": 0,
+        "first_tx_timestamp": None,
+        "token_last_block": -1,
+        "tokens": [],
+    }
+
+
+def merge_tx_rows(history: dict, rows):
+    """
+    Folds new txlist rows (sorted by block, ascending) into the aggregates.
+
+    Args:
+        history (dict): Current aggregates, as returned by WalletHistoryStore.load().
+        rows (list): Etherscan txlist rows newer than history["tx_last_block"].
+
+    Returns:
+        (dict): The updated tx_count / first_tx_timestamp / tx_last_block.
+    """
+    tx_count = history["tx_count"]
+    first_tx_timestamp = history["first_tx_timestamp"]
+    last_block = history["tx_last_block"]
+
+    for tx in rows:
+        tx_count += 1
+        if first_tx_timestamp is None:
+            first_tx_timestamp = int(tx['timeStamp'])
+        last_block = max(last_block, int(tx['blockNumber']))
+
+    return {"tx_count": tx_count, "first_tx_timestamp": first_tx_timestamp, "tx_last_block": last_block}
+
+
+def merge_token_rows(history: dict, rows):
+    """
+    Folds new tokentx rows into the set of distinct token symbols.
+
+    Args:
+        history (dict): Current aggregates, as returned by WalletHistoryStore.load().
+        rows (list): Etherscan tokentx rows newer than history["token_last_block"].
+
+    Returns:
+        (dict): The updated tokens (sorted list) / token_last_block.
+    """
+    tokens = set(history["tokens"])
+    last_block = history["token_last_block"]
+
+    for tx in rows:
+        tokens.add(tx['tokenSymbol'])
+        last_block = max(last_block, int(tx['blockNumber']))
+
+    return {"tokens": sorted(tokens), "token_last_block": last_block}
+
+
+class WalletHistoryStore:
+    """
+    Persists per-wallet history aggregates plus the last block each
+    Etherscan stream (txlist / tokentx) has been synced to, so later scoring
+    runs only download blocks after the checkpoint.
+
+    The two streams are saved independently, so the txlist and tokentx
+    fetches for the same wallet can run concurrently without clobbering
+    each other.
+
+    Args:
+        path (str): SQLite database file.
+    """
+    def __init__(self, path: str = "wallet_history.sqlite3"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS wallet_history ("
+                " address TEXT PRIMARY KEY,"
+                " tx_last_block INTEGER NOT NULL DEFAULT -1,"
+                " tx_count INTEGER NOT NULL DEFAULT 0,"
+                " first_tx_timestamp INTEGER,"
+                " token_last_block INTEGER NOT NULL DEFAULT -1,"
+                " tokens TEXT NOT NULL DEFAULT '[]')"
+            )
+
+    def load(self, address: str):
+        """Returns the stored aggregates for a wallet (empty_history() if unseen)."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT tx_last_block, tx_count, first_tx_timestamp, token_last_block, tokens"
+                " FROM wallet_history WHERE address = ?",
+                (address,),
+            ).fetchone()
+        if row is None:
+            return empty_history()
+        return {
+            "tx_last_block": row[0],
+            "tx_count": row[1],
+            "first_tx_timestamp": row[2],
+            "token_last_block": row[3],
+            "tokens": json.loads(row[4]),
+        }
+
+    def save_tx(self, address: str, tx_count: int, first_tx_timestamp, tx_last_block: int):
+        """Updates only the txlist aggregates and checkpoint."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO wallet_history (address, tx_count, first_tx_timestamp, tx_last_block) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT(address) DO UPDATE SET"
+                " tx_count = excluded.tx_count,"
+                " first_tx_timestamp = excluded.first_tx_timestamp,"
+                " tx_last_block = excluded.tx_last_block",
+                (address, tx_count, first_tx_timestamp, tx_last_block),
+            )
+
+    def save_tokens(self, address: str, tokens: list, token_last_block: int):
+        """Updates only the tokentx aggregates and checkpoint."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO wallet_history (address, tokens, token_last_block) VALUES (?, ?, ?)"
+                " ON CONFLICT(address) DO UPDATE SET"
+                " tokens = excluded.tokens,"
+                " token_last_block = excluded.token_last_block",
+                (address, json.dumps(tokens), token_last_block),
+            )
+
+    def reset(self, address: str):
+        """Forgets a wallet's checkpoint so the next run re-syncs from block 0."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM wallet_history WHERE address = ?", (address,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()